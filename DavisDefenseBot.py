@@ -3,11 +3,32 @@ import discord
 from discord.ext import commands, tasks
 from dotenv import load_dotenv
 import datetime
-import json
-import random
 import asyncio
 import sys
-import subprocess
+import atexit
+import json
+import signal
+import bisect
+import heapq
+import itertools
+import time
+from storage import JournaledStore, SqliteStore, atomic_write, load_json
+from ranks import RankIndex
+from role_sync import RoleSyncQueue
+from guild_cache import GuildIndex
+from leaderboard import Leaderboard
+from roster import RosterCache
+from combat import CombatProfileCache
+from game_state import GameStateRegistry
+from snapshot import PlayerSnapshot, SnapshotError, FORMAT_VERSION as SNAPSHOT_VERSION
+from players import PlayerTable, SKILL_NAMES, MATERIAL_INDEX, ITEM_INDEX, HONOR, STATS, SKILLS, ARMORY
+from cooldowns import CooldownManager
+from render_cache import RenderCache
+from engine import GameEngine, endurance_cooldown, max_craftable
+from metrics import Metrics
+from loop_watchdog import LoopWatchdog
+from game_data import (RANK_ROLES, ACQUIRABLE_RANK_ROLES, RANK_ROLE_NAMES, ACQUIRABLE_RANK_ROLE_NAMES,
+                       MATERIALS, RECIPES)
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_BOT_TOKEN")
@@ -26,202 +47,414 @@ NOTIFICATION_ROLE_NAME = "HDAAF Notifications"
 ANNOUNCEMENT_CHANNEL_NAME = "hdaaf-announcements"
 EMO_HUNTER_ROLE_NAME = "Emo Hunter"
 PRISONER_ROLE_NAME = "Prisoner of War"
+# Set GAME_SEED to make every roll reproducible, e.g. when replaying a recorded session.
+GAME_SEED = os.getenv("GAME_SEED")
 
 # --- Game Data Structures ---
-RANK_ROLES = [
-    {"name": "Private", "honor": 0, "weight": 1, "base_health": 100},
-    {"name": "Private First Class", "honor": 150, "weight": 2, "base_health": 120},
-    {"name": "Corporal", "honor": 600, "weight": 3, "base_health": 140},
-    {"name": "Sergeant", "honor": 1350, "weight": 4, "base_health": 160},
-    {"name": "Staff Sergeant", "honor": 2400, "weight": 5, "base_health": 180},
-    {"name": "Master Sergeant", "honor": 3750, "weight": 6, "base_health": 200},
-    {"name": "Sergeant Major", "honor": 5400, "weight": 7, "base_health": 220},
-    {"name": "Lieutenant", "honor": 7350, "weight": 8, "base_health": 250},
-    {"name": "Captain", "honor": 9600, "weight": 9, "base_health": 280},
-    {"name": "Major", "honor": 12150, "weight": 10, "base_health": 320},
-    {"name": "Colonel", "honor": 15000, "weight": 11, "base_health": 360},
-    {"name": "Brigadier General", "honor": 18150, "weight": 12, "base_health": 400},
-    {"name": "General", "honor": 21600, "weight": 13, "base_health": 450},
-    {"name": "General of the Army", "honor": 25350, "weight": 15, "base_health": 500}
-]
-ACQUIRABLE_RANK_ROLES = RANK_ROLES[:11]
-RANK_ROLE_NAMES = {role["name"] for role in RANK_ROLES}
-ACQUIRABLE_RANK_ROLE_NAMES = {role["name"] for role in ACQUIRABLE_RANK_ROLES}
-UNACQUIRABLE_RANK_ROLE_NAMES = RANK_ROLE_NAMES - ACQUIRABLE_RANK_ROLE_NAMES
-
-MATERIALS = [
-    {"name": "Scrap Metal", "rarity": "common", "emoji": "🔩"},
-    {"name": "Gunpowder", "rarity": "common", "emoji": "🧨"},
-    {"name": "Duct Tape", "rarity": "common", "emoji": "🩹"},
-    {"name": "Electronics", "rarity": "uncommon", "emoji": "⚙️"},
-    {"name": "High-Grade Steel", "rarity": "uncommon", "emoji": "🛡️"},
-    {"name": "Medical Supplies", "rarity": "uncommon", "emoji": "⚕️"},
-    {"name": "Advanced Optics", "rarity": "rare", "emoji": "🔭"},
-    {"name": "Military-Grade Composite", "rarity": "rare", "emoji": "🪖"},
-    {"name": "Nuclear Material", "rarity": "legendary", "emoji": "☢️"}
-]
-MATERIAL_RARITY_WEIGHTS = {
-    "common": 60,
-    "uncommon": 30,
-    "rare": 9,
-    "legendary": 1
-}
-
-RECIPES = {
-    "Pipe Bomb": {
-        "description": "A simple, yet effective, explosive device.",
-        "materials": {"Scrap Metal": 5, "Gunpowder": 3, "Duct Tape": 1}, "emoji": "💣", "type": "consumable",
-        "intelligence_req": 5, "pvp_effect": {"damage": (40, 60)}
-    },
-    "Medkit": {
-        "description": "Restores health in the field.",
-        "materials": {"Medical Supplies": 5, "Duct Tape": 2}, "emoji": "➕", "type": "consumable",
-        "intelligence_req": 10, "pvp_effect": {"heal": (50, 80)}
-    },
-    "Pistol": {
-        "description": "Standard issue sidearm. Adds +2 power.",
-        "materials": {"Scrap Metal": 10, "High-Grade Steel": 2}, "emoji": "1️⃣", "type": "weapon", "weight_bonus": 2,
-        "intelligence_req": 15
-    },
-    "Shotgun": {
-        "description": "Devastating at close range. Adds +4 power.",
-        "materials": {"Scrap Metal": 15, "High-Grade Steel": 5, "Gunpowder": 5}, "emoji": "2️⃣", "type": "weapon",
-        "weight_bonus": 4, "intelligence_req": 20
-    },
-    "Assault Rifle": {
-        "description": "A versatile automatic weapon. Adds +6 power.",
-        "materials": {"High-Grade Steel": 10, "Electronics": 5, "Scrap Metal": 20}, "emoji": "3️⃣", "type": "weapon",
-        "weight_bonus": 6, "intelligence_req": 30
-    },
-    "Sniper Rifle": {
-        "description": "For taking out targets from a distance. Adds +8 power.",
-        "materials": {"High-Grade Steel": 15, "Advanced Optics": 2, "Electronics": 3}, "emoji": "4️⃣", "type": "weapon",
-        "weight_bonus": 8, "intelligence_req": 40
-    },
-    "Rocket Launcher": {
-        "description": "Delivers a high-explosive payload. Adds +12 power.",
-        "materials": {"High-Grade Steel": 25, "Electronics": 10, "Gunpowder": 20, "Military-Grade Composite": 5},
-        "emoji": "🚀", "type": "weapon", "weight_bonus": 12, "intelligence_req": 50
-    },
-    "Body Armor": {
-        "description": "Reduces incoming damage. (Passive)",
-        "materials": {"High-Grade Steel": 20, "Military-Grade Composite": 10}, "emoji": "🦺", "type": "armor",
-        "intelligence_req": 25
-    },
-    "Nightvision Goggles": {
-        "description": "Grants the ability to see in the dark. (Passive)",
-        "materials": {"Electronics": 15, "Advanced Optics": 5, "Duct Tape": 5}, "emoji": "🥽", "type": "gear",
-        "intelligence_req": 35
-    },
-    "Suppressor": {
-        "description": "Reduces weapon noise. (Passive)",
-        "materials": {"Scrap Metal": 15, "Electronics": 1}, "emoji": "🤫", "type": "gear", "intelligence_req": 15
-    },
-    "Tactical Nuke": {
-        "description": "The ultimate weapon. Use with extreme caution.",
-        "materials": {"Nuclear Material": 3, "Military-Grade Composite": 20, "Electronics": 30, "High-Grade Steel": 50},
-        "emoji": "☢️", "type": "consumable", "intelligence_req": 90, "pvp_effect": {"damage": 9999}
-    },
-    "Coast Guard Battleship": {
-        "description": "A formidable naval vessel.",
-        "materials": {"Nuclear Material": 10, "High-Grade Steel": 200, "Military-Grade Composite": 100,
-                      "Electronics": 150, "Advanced Optics": 50}, "emoji": "🚢", "type": "vehicle",
-        "intelligence_req": 100
-    }
-}
+rank_index = RankIndex(RANK_ROLES, len(ACQUIRABLE_RANK_ROLES))
+engine = GameEngine(None if GAME_SEED is None else int(GAME_SEED), rank_index)
+roster_cache = RosterCache([rank["name"] for rank in reversed(RANK_ROLES)])
+RECIPE_NAMES = {name.lower(): name for name in RECIPES}
+MATERIAL_EMOJIS = {m["name"]: m["emoji"] for m in MATERIALS}
+ITEM_EMOJIS = {name: recipe["emoji"] for name, recipe in RECIPES.items()}
+# The crafting page only changes when a player's Intelligence crosses one of these, so its recipe lines are
+# rendered once per threshold: (field name, requirements, unlocked) for every recipe.
+INTELLIGENCE_THRESHOLDS = sorted({recipe["intelligence_req"] for recipe in RECIPES.values()})
+CRAFTING_LINES = [
+    [(f"{recipe['emoji'] if recipe['intelligence_req'] <= level else '🔒'} {name} "
+      f"(Lvl {recipe['intelligence_req']} Intel)",
+      "**Requires:** " + ", ".join(f"{amt}x {mat}" for mat, amt in recipe["materials"].items()),
+      recipe["intelligence_req"] <= level)
+     for name, recipe in RECIPES.items()]
+    for level in [0] + INTELLIGENCE_THRESHOLDS]
 
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
 
-bot = commands.Bot(command_prefix=">", intents=intents, owner_id=OWNER_ID)
+
+class DavisBot(commands.Bot):
+    """Bot that flushes the store when it closes, including when systemd stops it with SIGTERM."""
+
+    shutdown_task = None
+
+    async def setup_hook(self):
+        # bot.run only handles KeyboardInterrupt; without these, SIGTERM kills the process with changes unflushed.
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_shutdown)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    def request_shutdown(self):
+        if self.shutdown_task is None:
+            self.shutdown_task = asyncio.create_task(self.close())
+
+    async def close(self):
+        await super().close()
+        store.flush_sync()
+
+
+bot = DavisBot(command_prefix=">", intents=intents, owner_id=OWNER_ID)
 bot.remove_command('help')
+guild_index = GuildIndex()
 
 # --- Global State & Cooldowns ---
 game_features_enabled = True
-attack_in_progress = False
-defenders = set()
-patrol_cooldowns = {}
-salute_cooldowns = {}
-scavenge_cooldowns = {}
-train_cooldowns = {}
-davis_salute_event_active = False
-davis_saluters = set()
-boss_event_active = False
-boss_hp = 0
-boss_max_hp = 0
-boss_title = ""
-boss_participants = set()
-boss_event_message = None
-boss_health_dirty = False
-pvp_invitations = {}
-active_pvp_matches = {}
+cooldowns = CooldownManager()
+patrol_cooldowns = cooldowns.register("patrol", 60)
+salute_cooldowns = cooldowns.register("salute", 300)
+SCAVENGE_MAX_CHARGES = 10
+scavenge_cooldowns = cooldowns.register("scavenge", 60, max_charges=SCAVENGE_MAX_CHARGES)
+# A plain >scavenge keeps the one-run-per-cooldown pace; banked charges are only spent with an explicit run count.
+scavenge_run_cooldowns = cooldowns.register("scavenge_run", 60)
+train_cooldowns = cooldowns.register("train", 60)
+game_states = GameStateRegistry()
 
 # --- Data File Management ---
 HONOR_FILE = "honor.json"
 STATS_FILE = "user_stats.json"
 ARMORY_FILE = "armory.json"
 SKILLS_FILE = "user_skills.json"
+JOURNAL_FILE = "data.journal"
+# Per-guild settings made with owner commands (currently the >attackchannel target).
+GUILD_SETTINGS_FILE = "guild_settings.json"
+# The JSON backend keeps all players in one versioned snapshot; the four files above are only read to migrate.
+SNAPSHOT_FILE = "players.snapshot"
+SNAPSHOT_FORMAT = os.getenv("SNAPSHOT_FORMAT", "json").lower()
+DATABASE_FILE = os.getenv("DATABASE_FILE", "davis.db")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+PERSIST_INTERVAL_SECONDS = 5
+PERSIST_MAX_PENDING = 100
+# With the SQLite backend only this many recently active players are kept in memory.
+PLAYER_CACHE_SIZE = int(os.getenv("PLAYER_CACHE_SIZE", "5000"))
+# Prometheus text metrics are served on localhost only; set METRICS_PORT=0 to turn the endpoint off.
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+# Event loop stalls longer than this are logged with the stack of whatever was blocking.
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.25"))
+
+startup_started = time.perf_counter()
+startup_timings = []
+
+
+def startup_phase(name, started):
+    startup_timings.append(f"{name} {(time.perf_counter() - started) * 1000:.1f} ms")
+    return time.perf_counter()
+
+
+def json_backend_tables():
+    """The JSON backend's current data: its snapshot (or the old data files before it migrated) plus the journal.
+
+    The data files stop being updated once players.snapshot exists, so importing them alone would lose progress.
+    """
+    table = PlayerTable()
+    snapshot = PlayerSnapshot(SNAPSHOT_FILE, table)
+    if snapshot.exists():
+        try:
+            snapshot.load()
+        except SnapshotError as e:
+            print(f"FATAL ERROR: can't import {SNAPSHOT_FILE} into {DATABASE_FILE}: {e}")
+            sys.exit(1)
+    else:
+        for view, file_path in ((table.honor, HONOR_FILE), (table.stats, STATS_FILE),
+                                (table.skills, SKILLS_FILE), (table.armory, ARMORY_FILE)):
+            view.update(load_json(file_path))
+    tables = {HONOR_FILE: table.honor, STATS_FILE: table.stats, ARMORY_FILE: table.armory, SKILLS_FILE: table.skills}
+    JournaledStore(JOURNAL_FILE).replay(tables)
+    return tables
+
+
+phase_started = time.perf_counter()
+if STORAGE_BACKEND == "sqlite":
+    store = SqliteStore(DATABASE_FILE, {HONOR_FILE: "honor", STATS_FILE: "stats", ARMORY_FILE: "armory",
+                                        SKILLS_FILE: "skills"}, max_pending=PERSIST_MAX_PENDING)
+    if store.import_json(json_backend_tables):
+        print(f"Imported existing JSON data into {DATABASE_FILE}.")
+else:
+    store = JournaledStore(JOURNAL_FILE, max_pending=PERSIST_MAX_PENDING)
+
+metrics = Metrics()
+metrics_runner = None
+command_latency = metrics.latency("davis_command_seconds", "Prefix command latency.", "command")
+# Cooldowns, failed checks, unknown commands and bad arguments are the bot working as intended, not errors.
+COMMAND_REJECTIONS = (commands.CommandOnCooldown, commands.CheckFailure, commands.CommandNotFound,
+                      commands.UserInputError, commands.BadArgument)
+command_rejections = metrics.counter("davis_command_rejections_total",
+                                     "Commands refused by a cooldown, check or bad input.", "command")
+component_latency = metrics.latency("davis_component_seconds", "Button and select callback latency.", "component")
+persist_latency = metrics.latency("davis_persist_seconds", "Time spent in storage calls.", "op")
+rest_latency = metrics.latency("davis_rest_seconds", "Discord REST call latency.", "call")
+persist_latency.instrument(store, "mark_dirty", "record", "record_many", "flush", "flush_sync")
+loop_lag = metrics.latency("davis_loop_lag_seconds", "How late the event loop ran a scheduled wakeup.", "loop")
+loop_stalls = metrics.counter("davis_loop_stalls_total", "Event loop stalls by the function that was blocking.",
+                              "culprit")
+
+
+def report_stall(stall):
+    loop_stalls.inc(stall.culprit)
+    print(f"WARNING: Event loop blocked for {stall.lag * 1000:.0f} ms in {stall.culprit}\n{stall.stack}", end="")
+
+
+loop_watchdog = LoopWatchdog(LOOP_LAG_THRESHOLD, on_lag=lambda lag: loop_lag.observe("main", lag),
+                             on_stall=report_stall)
+atexit.register(store.flush_sync)
 
 
 def load_data(file_path):
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        with open(file_path, "r") as f:
-            return json.load(f)
-    return {}
+    return store.load(file_path)
+
+
+def save_data(data, file_path, *user_ids):
+    """Queues data for persistence; pass the changed user IDs so row-level backends only touch those rows."""
+    store.mark_dirty(file_path, data, *[str(user_id) for user_id in user_ids])
+
+
+def load_guild_settings():
+    for guild_id, settings in load_json(GUILD_SETTINGS_FILE).items():
+        game_states.get(int(guild_id)).attack_channel_id = settings.get("attack_channel_id")
+
+
+def save_guild_settings():
+    settings = {str(state.guild_id): {"attack_channel_id": state.attack_channel_id}
+                for state in game_states if state.attack_channel_id}
+    atomic_write(GUILD_SETTINGS_FILE, json.dumps(settings, indent=4))
+
 
+load_guild_settings()
 
-def save_data(data, file_path):
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4)
 
+def load_player_rows(user_id):
+    rows = {HONOR: store.load_user(HONOR_FILE, user_id), STATS: store.load_user(STATS_FILE, user_id),
+            SKILLS: store.load_user(SKILLS_FILE, user_id), ARMORY: store.load_user(ARMORY_FILE, user_id)}
+    # None tells PlayerTable the user is unknown, so a lookup doesn't admit a blank player and evict a real one.
+    return rows if any(row is not None for row in rows.values()) else None
 
-user_honor = load_data(HONOR_FILE)
-user_stats = load_data(STATS_FILE)
-user_armory = load_data(ARMORY_FILE)
-user_skills = load_data(SKILLS_FILE)
+
+def forget_player(player):
+    """Drops an evicted player from the per-user caches, so they stay proportional to resident players."""
+    inventory_versions.pop(str(player.user_id), None)
+    combat_profiles.invalidate(player.user_id)
+
+
+phase_started = startup_phase("store", phase_started)
+if isinstance(store, SqliteStore):
+    players = PlayerTable(loader=load_player_rows, max_resident=PLAYER_CACHE_SIZE, on_evict=forget_player)
+else:
+    players = PlayerTable()
+    store.snapshot = PlayerSnapshot(SNAPSHOT_FILE, players, binary=SNAPSHOT_FORMAT == "binary")
+    if store.snapshot.exists():
+        try:
+            store.snapshot.load()
+        except SnapshotError as e:
+            print(f"FATAL ERROR: {e}")
+            sys.exit(1)
+    else:
+        for view, file_path in ((players.honor, HONOR_FILE), (players.stats, STATS_FILE),
+                                (players.skills, SKILLS_FILE), (players.armory, ARMORY_FILE)):
+            view.update(load_data(file_path))
+        store.schedule_compaction({SNAPSHOT_FILE: players})
+        print(f"Migrating player data to {SNAPSHOT_FILE} (format v{SNAPSHOT_VERSION}, {SNAPSHOT_FORMAT}); "
+              f"the old JSON files are left in place but no longer updated.")
+    phase_started = startup_phase("players", phase_started)
+# JSON-layout views over the player records, one per data file, for the store.
+user_honor, user_stats, user_skills, user_armory = players.honor, players.stats, players.skills, players.armory
+if isinstance(store, JournaledStore):
+    replayed = store.replay({HONOR_FILE: user_honor, STATS_FILE: user_stats, ARMORY_FILE: user_armory,
+                             SKILLS_FILE: user_skills})
+    if replayed:
+        print(f"Recovered {replayed} journaled change(s) from {JOURNAL_FILE}.")
+    phase_started = startup_phase("journal", phase_started)
+
+LEADERBOARD_PAGE_SIZE = 10
+if isinstance(store, SqliteStore):
+    # Players are loaded lazily, so the boards are built straight from the columns they rank.
+    honor_board = Leaderboard(store.column(HONOR_FILE))
+    streak_board = Leaderboard(store.column(STATS_FILE, "kill_streak"))
+else:
+    honor_board = Leaderboard({str(player.user_id): player.honor for player in players if player.sections & HONOR})
+    streak_board = Leaderboard({str(player.user_id): player.kill_streak for player in players})
+startup_phase("leaderboards", phase_started)
+print(f"Loaded player data in {(time.perf_counter() - startup_started) * 1000:.1f} ms "
+      f"({len(players)} resident, {len(honor_board)} ranked; {', '.join(startup_timings)}).")
 
 
 # --- Helper Functions ---
+def get_honor(user_id):
+    player = players.find(user_id)
+    return player.honor if player else 0
+
+
 def get_user_skills(user_id):
-    user_id = str(user_id)
-    if user_id not in user_skills:
-        user_skills[user_id] = {"strength": 1, "agility": 1, "intelligence": 1, "endurance": 1}
-        save_data(user_skills, SKILLS_FILE)
-    return user_skills[user_id]
+    player = players.get(user_id)
+    if not player.sections & SKILLS:
+        player.sections |= SKILLS
+        save_data(user_skills, SKILLS_FILE, user_id)
+    return player
 
 
 def get_user_stats(user_id):
-    user_id = str(user_id)
-    if user_id not in user_stats:
-        user_stats[user_id] = {"patrol_wins": 0, "kill_streak": 0}
-        save_data(user_stats, STATS_FILE)
-    return user_stats[user_id]
+    player = players.get(user_id)
+    if not player.sections & STATS:
+        player.sections |= STATS
+        save_data(user_stats, STATS_FILE, user_id)
+    return player
+
+
+def get_user_armory(user_id):
+    player = players.get(user_id)
+    player.sections |= ARMORY
+    return player
+
+
+combat_profiles = CombatProfileCache(rank_index, get_user_skills)
+
+
+# --- Data Mutations ---
+# Every change goes through one of these so the store can persist it as a small typed record.
+# Versions come from one counter, so a player reloaded after eviction never reuses a version that renders of
+# their old inventory are still cached under.
+inventory_versions = {}
+inventory_version_counter = itertools.count(1)
+
+
+def inventory_version(user_id):
+    version = inventory_versions.get(user_id)
+    if version is None:
+        version = inventory_versions[user_id] = next(inventory_version_counter)
+    return version
+
+
+def bump_inventory_version(user_id):
+    inventory_versions[str(user_id)] = next(inventory_version_counter)
+
+
+def add_honor(user_id, amount):
+    player = players.get(user_id)
+    player.honor += amount
+    player.sections |= HONOR
+    store.record("honor", HONOR_FILE, user_honor, str(user_id), delta=amount)
+    honor_board.update(str(user_id), player.honor)
+    return player.honor
+
+
+def add_honor_many(user_ids, amount):
+    """Grants the same honor to many users with one leaderboard update and one persisted record."""
+    user_ids = [str(user_id) for user_id in user_ids]
+    scores = {}
+    for user_id in user_ids:
+        player = players.get(user_id)
+        player.honor += amount
+        player.sections |= HONOR
+        scores[user_id] = player.honor
+    store.record_many("honor", HONOR_FILE, user_honor, user_ids, rows=scores, delta=amount)
+    honor_board.update_many(scores)
+
+
+def set_honor(user_id, amount):
+    player = players.get(user_id)
+    player.honor = amount
+    player.sections |= HONOR
+    store.record("set", HONOR_FILE, user_honor, str(user_id))
+    honor_board.update(str(user_id), amount)
+
+
+def add_materials(user_id, materials):
+    player = get_user_armory(user_id)
+    for name, amount in materials.items():
+        player.materials[MATERIAL_INDEX[name]] += amount
+    store.record("material", ARMORY_FILE, user_armory, str(user_id), delta=materials)
+    bump_inventory_version(user_id)
+
+
+def add_crafted_items(user_id, items):
+    player = get_user_armory(user_id)
+    for name, amount in items.items():
+        player.items[ITEM_INDEX[name]] += amount
+    store.record("item", ARMORY_FILE, user_armory, str(user_id), delta=items)
+    bump_inventory_version(user_id)
+    combat_profiles.invalidate(user_id)
+
+
+def craft_item(user_id, item_name, quantity=1):
+    """Crafts quantity of item_name as one mutation; callers check materials first with craft_error."""
+    player = get_user_armory(user_id)
+    for mat, required in RECIPES[item_name]["materials"].items():
+        player.materials[MATERIAL_INDEX[mat]] -= required * quantity
+    player.items[ITEM_INDEX[item_name]] += quantity
+    store.record("craft", ARMORY_FILE, user_armory, str(user_id), item=item_name, quantity=quantity)
+    bump_inventory_version(user_id)
+    combat_profiles.invalidate(user_id)
+
+
+def set_skill(user_id, skill, level):
+    player = get_user_skills(user_id)
+    delta = level - getattr(player, skill)
+    setattr(player, skill, level)
+    store.record("skill", SKILLS_FILE, user_skills, str(user_id), skill=skill, delta=delta)
+    combat_profiles.invalidate(user_id)
+
+
+def add_patrol_win(user_id):
+    player = get_user_stats(user_id)
+    player.patrol_wins += 1
+    store.record("stat", STATS_FILE, user_stats, str(user_id), stat="patrol_wins", delta=1)
+    return player.patrol_wins
+
+
+def health_bar_bucket(current_hp, max_hp, length=20):
+    percentage = max(0, current_hp) / max_hp if max_hp > 0 else 0
+    return int(length * percentage)
+
+
+def craft_plan(user_id):
+    """How many of every recipe the user could craft from their current materials, ignoring Intelligence."""
+    player = players.find(user_id)
+    return {name: max_craftable(player, recipe) if player else 0 for name, recipe in RECIPES.items()}
+
+
+def craft_error(user_id, item_name, quantity):
+    """Why user_id can't craft quantity of item_name, or None if they can."""
+    recipe = RECIPES[item_name]
+    smart_enough, missing = engine.craft_check(get_user_armory(user_id), recipe, quantity)
+    if not smart_enough:
+        return f"You aren't smart enough to craft this. You need **Level {recipe['intelligence_req']} Intelligence**."
+    if missing:
+        missing_mats = [f"**{amount}** more `{mat}`" for mat, amount in missing.items()]
+        amount = f"{quantity}x " if quantity > 1 else ""
+        return f"You can't craft {amount}**{item_name}**. You still need: {', '.join(missing_mats)}."
+    return None
 
 
 def create_health_bar(current_hp, max_hp, length=20):
     current_hp = max(0, current_hp)
-    percentage = current_hp / max_hp if max_hp > 0 else 0
-    filled_length = int(length * percentage)
+    filled_length = health_bar_bucket(current_hp, max_hp, length)
     bar = '█' * filled_length + '─' * (length - filled_length)
     return f"`[{bar}]`\n**{int(current_hp)} / {int(max_hp)} HP**"
 
 
+def name_list(names, limit=1024):
+    """Newline-separated names trimmed to fit an embed field, ending with a count of whoever didn't fit."""
+    lines, used = [], 0
+    for index, name in enumerate(names):
+        more = f"...and {len(names) - index} more"
+        if used + len(name) + 1 + len(more) > limit:
+            lines.append(more)
+            break
+        lines.append(name)
+        used += len(name) + 1
+    return "\n".join(lines) or "None"
+
+
 # --- Role Management ---
 async def check_and_update_roles(member: discord.Member):
     if not game_features_enabled: return
-    for role in member.roles:
-        if role.name in UNACQUIRABLE_RANK_ROLE_NAMES:
-            return
-    user_id = str(member.id)
-    current_honor = user_honor.get(user_id, 0)
-    target_role_data = None
-    for rank in reversed(ACQUIRABLE_RANK_ROLES):
-        if current_honor >= rank["honor"]:
-            target_role_data = rank
-            break
+    current_rank = rank_index.member_rank(member)
+    if current_rank and not rank_index.is_acquirable(current_rank): return
+    target_role_data = rank_index.acquirable_rank_for_honor(get_honor(member.id))
     if not target_role_data: return
-    target_role_obj = discord.utils.get(member.guild.roles, name=target_role_data["name"])
+    target_role_obj = guild_index.role(member.guild, target_role_data["name"])
     if not target_role_obj: return
 
     new_roles = [role for role in member.roles if role.name not in ACQUIRABLE_RANK_ROLE_NAMES]
@@ -229,224 +462,335 @@ async def check_and_update_roles(member: discord.Member):
 
     if set(new_roles) != set(member.roles):
         try:
-            await member.edit(roles=new_roles, reason="Automatic rank update")
+            with rest_latency.time("member_edit"):
+                await member.edit(roles=new_roles, reason="Automatic rank update")
         except discord.Forbidden:
             print(f"ERROR: Bot lacks permissions to manage roles for {member.name}")
         except discord.HTTPException as e:
             print(f"ERROR: Failed to update roles for {member.name}: {e}")
+        return True
+
+
+role_sync = RoleSyncQueue(check_and_update_roles)
+metrics.gauge("davis_role_sync_pending", "Members waiting for a rank role sync.", lambda: role_sync.depth)
+metrics.gauge("davis_persist_pending", "Changes recorded but not yet flushed.", lambda: store.pending)
+metrics.gauge("davis_players_resident", "Player records held in memory.", lambda: len(players))
+metrics.gauge("davis_uptime_seconds", "Seconds since the bot process started.",
+              lambda: round(time.monotonic() - metrics.started))
+
+
+def queue_role_update(member: discord.Member):
+    """Schedules a rank role sync; repeated calls before it runs collapse into one edit."""
+    role_sync.enqueue(member)
 
 
 # --- UI Views ---
-class PatrolEncounterView(discord.ui.View):
-    def __init__(self, author: discord.Member):
-        super().__init__(timeout=30.0)
-        self.author = author
-        self.result = None
+# Rendered armory pages, keyed by the inventory version (and Intelligence threshold) they were rendered from.
+armory_renders = RenderCache()
 
-    async def interaction_check(self, interaction: discord.Interaction) -> bool:
-        if interaction.user.id != self.author.id:
-            await interaction.response.send_message("This is not your patrol!", ephemeral=True)
-            return False
+
+def inventory_fields(user_id):
+    def render():
+        player = players.find(user_id)
+        materials = sorted(player.armory_json()["materials"].items()) if player else []
+        crafted_items = sorted(player.armory_json()["crafted_items"].items()) if player else []
+        mat_description = "\n".join(
+            [f"{MATERIAL_EMOJIS.get(name, '❔')} **{name}**: {amount}" for name, amount in materials])
+        item_description = "\n".join(
+            [f"{ITEM_EMOJIS.get(name, '🛠️')} **{name}**: {amount}" for name, amount in crafted_items])
+        return (("Crafting Materials", mat_description or "None"), ("Crafted Items", item_description or "None"))
+
+    return armory_renders.get(("inventory", user_id, inventory_version(user_id)), render)
+
+
+def crafting_fields(user_id):
+    tier = bisect.bisect_right(INTELLIGENCE_THRESHOLDS, get_user_skills(user_id).intelligence)
+
+    def render():
+        plan = craft_plan(user_id)
+        return tuple((name, f"{requires}\n**Can craft:** {plan[item_name]}" if unlocked else requires)
+                     for item_name, (name, requires, unlocked) in zip(RECIPES, CRAFTING_LINES[tier]))
+
+    return armory_renders.get(("crafting", user_id, inventory_version(user_id), tier), render)
+
+
+# Buttons and selects carry their owner and state in their custom_id and are routed by DynamicItems that are
+# registered once at startup, so open messages hold no live views or waiting coroutines and survive restarts.
+PATROL_ENCOUNTER_SECONDS = 30
+TRAIN_MENU_SECONDS = 60
+# Messages whose one-shot component (a patrol encounter or a training session) has already been used.
+component_claims = cooldowns.register("component_claims", 120)
+
+
+def component_view(*items):
+    view = discord.ui.View(timeout=None)
+    for item in items:
+        view.add_item(item)
+    return view
+
+
+async def is_owner_interaction(interaction: discord.Interaction, owner_id, message=None):
+    if interaction.user.id == owner_id:
         return True
+    if message:
+        await interaction.response.send_message(message, ephemeral=True)
+    return False
+
+
+class PatrolButton(discord.ui.DynamicItem[discord.ui.Button],
+                   template=r"davis:patrol:(?P<user_id>\d+):(?P<action>attack|retreat):(?P<expires>\d+)"):
+    def __init__(self, user_id, action, expires):
+        self.user_id = user_id
+        self.action = action
+        self.expires = expires
+        style = discord.ButtonStyle.red if action == "attack" else discord.ButtonStyle.secondary
+        super().__init__(discord.ui.Button(label=action.title(), style=style,
+                                           custom_id=f"davis:patrol:{user_id}:{action}:{expires}"))
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["user_id"]), match["action"], int(match["expires"]))
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await is_owner_interaction(interaction, self.user_id, "This is not your patrol!")
+
+    @component_latency.timed("patrol")
+    async def callback(self, interaction: discord.Interaction):
+        if component_claims.try_acquire(interaction.message.id):
+            return await interaction.response.defer()
+        if self.action == "retreat" or time.time() > self.expires:
+            result_embed = discord.Embed(title="Patrol Ended", description="You chose to retreat, avoiding a risky fight.",
+                                         color=discord.Color.light_grey())
+            return await interaction.response.edit_message(embed=result_embed, view=None)
+        await resolve_patrol_attack(interaction)
 
-    @discord.ui.button(label="Attack", style=discord.ButtonStyle.red)
-    async def attack(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.result = "attack";
-        self.stop();
-        await interaction.response.defer()
 
-    @discord.ui.button(label="Retreat", style=discord.ButtonStyle.secondary)
-    async def retreat(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.result = "retreat";
-        self.stop();
-        await interaction.response.defer()
+def patrol_view(user_id):
+    expires = int(time.time()) + PATROL_ENCOUNTER_SECONDS
+    return component_view(PatrolButton(user_id, "attack", expires), PatrolButton(user_id, "retreat", expires))
 
-    async def on_timeout(self):
-        self.result = "timeout"
 
+ARMORY_PAGES = "inventory|crafting"
+ARMORY_QUANTITIES = ["1", "5", "10", "25", "max"]
 
-class ArmoryView(discord.ui.View):
-    def __init__(self, author: discord.Member):
-        super().__init__(timeout=120.0)
-        self.author = author
-        self.current_page = "inventory"
-        self.add_item(CraftingSelect(author))
+
+def armory_embed(member: discord.Member, page):
+    member_id = str(member.id)
+    embed = discord.Embed(color=discord.Color.dark_gray())
+    embed.set_author(name=f"{member.display_name}'s Armory", icon_url=member.display_avatar.url)
+
+    if page == "inventory":
+        embed.title = "Inventory"
+        fields = inventory_fields(member_id)
+    else:
+        embed.title = "Crafting Menu"
+        embed.description = "Pick a quantity, then select an item from the dropdown below to craft it."
+        fields = crafting_fields(member_id)
+
+    for name, value in fields:
+        embed.add_field(name=name, value=value, inline=False)
+    return embed
+
+
+def armory_view(user_id, page, quantity):
+    return component_view(ArmoryPageButton(user_id, "inventory", quantity), ArmoryPageButton(user_id, "crafting", quantity),
+                          CraftingSelect(user_id, page, quantity), QuantitySelect(user_id, page, quantity))
+
+
+class ArmoryPageButton(discord.ui.DynamicItem[discord.ui.Button],
+                       template=rf"davis:armory:(?P<user_id>\d+):page:(?P<page>{ARMORY_PAGES}):(?P<quantity>\w+)"):
+    LABELS = {"inventory": ("View Inventory", "📦"), "crafting": ("View Crafting", "🛠️")}
+
+    def __init__(self, user_id, page, quantity):
+        self.user_id = user_id
+        self.page = page
+        self.quantity = quantity
+        label, emoji = self.LABELS[page]
+        super().__init__(discord.ui.Button(label=label, style=discord.ButtonStyle.secondary, emoji=emoji,
+                                           custom_id=f"davis:armory:{user_id}:page:{page}:{quantity}"))
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["user_id"]), match["page"], match["quantity"])
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
-        if interaction.user.id != self.author.id:
-            await interaction.response.send_message("This is not your armory!", ephemeral=True)
-            return False
-        return True
+        return await is_owner_interaction(interaction, self.user_id, "This is not your armory!")
+
+    @component_latency.timed("armory_page")
+    async def callback(self, interaction: discord.Interaction):
+        await interaction.response.edit_message(embed=armory_embed(interaction.user, self.page),
+                                                view=armory_view(self.user_id, self.page, self.quantity))
+
 
-    async def generate_embed(self):
-        member_id = str(self.author.id)
-        armory_data = user_armory.get(member_id, {"materials": {}, "crafted_items": {}})
-        embed = discord.Embed(color=discord.Color.dark_gray())
-        embed.set_author(name=f"{self.author.display_name}'s Armory", icon_url=self.author.display_avatar.url)
-
-        if self.current_page == "inventory":
-            embed.title = "Inventory"
-            materials = armory_data.get("materials", {})
-            crafted_items = armory_data.get("crafted_items", {})
-            if not materials:
-                embed.add_field(name="Crafting Materials", value="None", inline=False)
-            else:
-                material_emojis = {m["name"]: m["emoji"] for m in MATERIALS}
-                mat_description = "\n".join(
-                    [f"{material_emojis.get(name, '❔')} **{name}**: {amount}" for name, amount in
-                     sorted(materials.items())])
-                embed.add_field(name="Crafting Materials", value=mat_description, inline=False)
-            if not crafted_items:
-                embed.add_field(name="Crafted Items", value="None", inline=False)
-            else:
-                item_emojis = {i: r["emoji"] for i, r in RECIPES.items()}
-                item_description = "\n".join([f"{item_emojis.get(name, '🛠️')} **{name}**: {amount}" for name, amount in
-                                              sorted(crafted_items.items())])
-                embed.add_field(name="Crafted Items", value=item_description, inline=False)
-
-        elif self.current_page == "crafting":
-            embed.title = "Crafting Menu"
-            embed.description = "Select an item from the dropdown below to craft it."
-            user_intel = get_user_skills(self.author.id)['intelligence']
-            for name, recipe in RECIPES.items():
-                req = recipe['intelligence_req']
-                mats_needed = ", ".join([f"{amt}x {mat}" for mat, amt in recipe["materials"].items()])
-
-                if user_intel >= req:
-                    embed.add_field(name=f"{recipe['emoji']} {name} (Lvl {req} Intel)",
-                                    value=f"**Requires:** {mats_needed}", inline=False)
-                else:
-                    embed.add_field(name=f"🔒 {name} (Lvl {req} Intel)", value=f"**Requires:** {mats_needed}",
-                                    inline=False)
-
-        return embed
-
-    @discord.ui.button(label="View Inventory", style=discord.ButtonStyle.secondary, emoji="📦")
-    async def inventory_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.current_page = "inventory"
-        embed = await self.generate_embed()
-        await interaction.response.edit_message(embed=embed, view=self)
-
-    @discord.ui.button(label="View Crafting", style=discord.ButtonStyle.secondary, emoji="🛠️")
-    async def crafting_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.current_page = "crafting"
-        embed = await self.generate_embed()
-        await interaction.response.edit_message(embed=embed, view=self)
-
-
-class CraftingSelect(discord.ui.Select):
-    def __init__(self, author: discord.Member):
-        self.author = author
+class CraftingSelect(discord.ui.DynamicItem[discord.ui.Select],
+                     template=rf"davis:armory:(?P<user_id>\d+):craft:(?P<page>{ARMORY_PAGES}):(?P<quantity>\w+)"):
+    def __init__(self, user_id, page, quantity):
+        self.user_id = user_id
+        self.page = page
+        self.quantity = quantity
         options = [discord.SelectOption(label=name, description=recipe["description"][:100]) for name, recipe in
                    RECIPES.items()]
-        super().__init__(placeholder="Choose an item to craft...", min_values=1, max_values=1, options=options)
+        super().__init__(discord.ui.Select(placeholder="Choose an item to craft...", min_values=1, max_values=1,
+                                           options=options, custom_id=f"davis:armory:{user_id}:craft:{page}:{quantity}"))
 
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["user_id"]), match["page"], match["quantity"])
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await is_owner_interaction(interaction, self.user_id, "This is not your armory!")
+
+    @component_latency.timed("armory_craft")
     async def callback(self, interaction: discord.Interaction):
-        item_to_craft = self.values[0]
+        item_to_craft = self.item.values[0]
         recipe = RECIPES[item_to_craft]
-        author_id = str(self.author.id)
+        author_id = str(self.user_id)
+        if self.quantity == "max":
+            quantity = max(1, max_craftable(get_user_armory(author_id), recipe))
+        else:
+            quantity = int(self.quantity)
 
-        user_intel = get_user_skills(author_id)['intelligence']
-        if user_intel < recipe['intelligence_req']:
-            await interaction.response.send_message(
-                f"You aren't smart enough to craft this. You need **Level {recipe['intelligence_req']} Intelligence**.",
-                ephemeral=True)
+        error = craft_error(author_id, item_to_craft, quantity)
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
             return
 
-        if author_id not in user_armory:
-            user_armory[author_id] = {"materials": {}, "crafted_items": {}}
+        craft_item(author_id, item_to_craft, quantity)
 
-        user_mats = user_armory[author_id].get("materials", {})
+        await interaction.response.edit_message(embed=armory_embed(interaction.user, self.page),
+                                                view=armory_view(self.user_id, self.page, self.quantity))
+        await interaction.followup.send(f"You successfully crafted {quantity}x {recipe['emoji']} **{item_to_craft}**!",
+                                        ephemeral=True)
 
-        can_craft = True
-        missing_mats = []
-        for mat, required in recipe["materials"].items():
-            if user_mats.get(mat, 0) < required:
-                can_craft = False
-                missing_mats.append(f"**{required - user_mats.get(mat, 0)}** more `{mat}`")
 
-        if not can_craft:
-            await interaction.response.send_message(
-                f"You can't craft **{item_to_craft}**. You still need: {', '.join(missing_mats)}.", ephemeral=True)
-            return
+class QuantitySelect(discord.ui.DynamicItem[discord.ui.Select],
+                     template=rf"davis:armory:(?P<user_id>\d+):quantity:(?P<page>{ARMORY_PAGES}):(?P<quantity>\w+)"):
+    def __init__(self, user_id, page, quantity):
+        self.user_id = user_id
+        self.page = page
+        options = [discord.SelectOption(label="Max" if value == "max" else f"Craft {value}", value=value,
+                                        default=value == quantity) for value in ARMORY_QUANTITIES]
+        super().__init__(discord.ui.Select(placeholder="Quantity", min_values=1, max_values=1, options=options,
+                                           custom_id=f"davis:armory:{user_id}:quantity:{page}:{quantity}"))
 
-        for mat, required in recipe["materials"].items():
-            user_armory[author_id]["materials"][mat] -= required
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["user_id"]), match["page"], match["quantity"])
 
-        if "crafted_items" not in user_armory[author_id]:
-            user_armory[author_id]["crafted_items"] = {}
-        user_armory[author_id]["crafted_items"][item_to_craft] = user_armory[author_id]["crafted_items"].get(
-            item_to_craft, 0) + 1
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await is_owner_interaction(interaction, self.user_id, "This is not your armory!")
 
-        save_data(user_armory, ARMORY_FILE)
+    @component_latency.timed("armory_quantity")
+    async def callback(self, interaction: discord.Interaction):
+        quantity = self.item.values[0]
+        if quantity not in ARMORY_QUANTITIES:
+            return await interaction.response.defer()
+        await interaction.response.edit_message(view=armory_view(self.user_id, self.page, quantity))
 
-        view = self.view
-        if isinstance(view, ArmoryView):
-            embed = await view.generate_embed()
-            await interaction.response.edit_message(embed=embed, view=view)
-            await interaction.followup.send(f"You successfully crafted a {recipe['emoji']} **{item_to_craft}**!",
-                                            ephemeral=True)
 
+TRAINING = {
+    "strength": ("Strength", discord.ButtonStyle.red, "💪", "You feel stronger!"),
+    "agility": ("Agility", discord.ButtonStyle.green, "⚡", "You feel faster!"),
+    "intelligence": ("Intelligence", discord.ButtonStyle.blurple, "🧠", "You feel smarter!"),
+    "endurance": ("Endurance", discord.ButtonStyle.grey, "❤️", "You feel more resilient!"),
+}
 
-class TrainView(discord.ui.View):
-    def __init__(self, author: discord.Member):
-        super().__init__(timeout=60.0)
-        self.author = author
+
+class TrainButton(discord.ui.DynamicItem[discord.ui.Button],
+                  template=rf"davis:train:(?P<user_id>\d+):(?P<skill>{'|'.join(SKILL_NAMES)}):(?P<expires>\d+)"):
+    def __init__(self, user_id, skill, expires):
+        self.user_id = user_id
+        self.skill = skill
+        self.expires = expires
+        label, style, emoji, _ = TRAINING[skill]
+        super().__init__(discord.ui.Button(label=label, style=style, emoji=emoji,
+                                           custom_id=f"davis:train:{user_id}:{skill}:{expires}"))
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["user_id"]), match["skill"], int(match["expires"]))
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
-        return interaction.user.id == self.author.id
-
-    @discord.ui.button(label="Strength", style=discord.ButtonStyle.red, emoji="💪")
-    async def train_strength(self, interaction: discord.Interaction, button: discord.ui.Button):
-        skills = get_user_skills(self.author.id)
-        if skills["strength"] >= 100:
-            await interaction.response.send_message("Your **Strength** is already at its maximum level (100).",
-                                                    ephemeral=True)
-        else:
-            skills["strength"] += 1
-            save_data(user_skills, SKILLS_FILE)
-            await interaction.response.send_message(
-                f"You feel stronger! Your **Strength** is now Level {skills['strength']}.", ephemeral=True)
-        self.stop()
-
-    @discord.ui.button(label="Agility", style=discord.ButtonStyle.green, emoji="⚡")
-    async def train_agility(self, interaction: discord.Interaction, button: discord.ui.Button):
-        skills = get_user_skills(self.author.id)
-        if skills["agility"] >= 100:
-            await interaction.response.send_message("Your **Agility** is already at its maximum level (100).",
-                                                    ephemeral=True)
-        else:
-            skills["agility"] += 1
-            save_data(user_skills, SKILLS_FILE)
-            await interaction.response.send_message(
-                f"You feel faster! Your **Agility** is now Level {skills['agility']}.", ephemeral=True)
-        self.stop()
-
-    @discord.ui.button(label="Intelligence", style=discord.ButtonStyle.blurple, emoji="🧠")
-    async def train_intelligence(self, interaction: discord.Interaction, button: discord.ui.Button):
-        skills = get_user_skills(self.author.id)
-        if skills["intelligence"] >= 100:
-            await interaction.response.send_message("Your **Intelligence** is already at its maximum level (100).",
-                                                    ephemeral=True)
-        else:
-            skills["intelligence"] += 1
-            save_data(user_skills, SKILLS_FILE)
-            await interaction.response.send_message(
-                f"You feel smarter! Your **Intelligence** is now Level {skills['intelligence']}.", ephemeral=True)
-        self.stop()
-
-    @discord.ui.button(label="Endurance", style=discord.ButtonStyle.grey, emoji="❤️")
-    async def train_endurance(self, interaction: discord.Interaction, button: discord.ui.Button):
-        skills = get_user_skills(self.author.id)
-        if skills["endurance"] >= 100:
-            await interaction.response.send_message("Your **Endurance** is already at its maximum level (100).",
-                                                    ephemeral=True)
+        return await is_owner_interaction(interaction, self.user_id)
+
+    @component_latency.timed("train")
+    async def callback(self, interaction: discord.Interaction):
+        if component_claims.try_acquire(interaction.message.id):
+            return await interaction.response.defer()
+        await interaction.response.edit_message(view=None)
+        if time.time() > self.expires:
+            return await interaction.followup.send("This training session has expired. Use `>train` to start another.",
+                                                   ephemeral=True)
+        label, _, _, flavor = TRAINING[self.skill]
+        skills = get_user_skills(self.user_id)
+        level = engine.train(getattr(skills, self.skill))
+        if level is None:
+            await interaction.followup.send(f"Your **{label}** is already at its maximum level (100).", ephemeral=True)
         else:
-            skills["endurance"] += 1
-            save_data(user_skills, SKILLS_FILE)
-            await interaction.response.send_message(
-                f"You feel more resilient! Your **Endurance** is now Level {skills['endurance']}.", ephemeral=True)
-        self.stop()
+            set_skill(self.user_id, self.skill, level)
+            await interaction.followup.send(f"{flavor} Your **{label}** is now Level {level}.", ephemeral=True)
+
+
+def train_view(user_id):
+    expires = int(time.time()) + TRAIN_MENU_SECONDS
+    return component_view(*(TrainButton(user_id, skill, expires) for skill in TRAINING))
+
+
+def roster_pages(guild: discord.Guild):
+    if not roster_cache.is_built(guild.id):
+        rank_members = {}
+        for rank_data in RANK_ROLES:
+            role_obj = guild_index.role(guild, rank_data["name"])
+            rank_members[rank_data["name"]] = role_obj.members if role_obj else []
+        roster_cache.build(guild.id, rank_members)
+    return roster_cache.pages(guild.id)
+
+
+def roster_embed(pages, page_index):
+    embed = discord.Embed(title="Server Rank Roster", description=pages[page_index],
+                          color=discord.Color.from_rgb(200, 160, 100))
+    if len(pages) > 1:
+        embed.set_footer(text=f"Page {page_index + 1}/{len(pages)}")
+    return embed
+
+
+def roster_view(user_id, pages, page_index):
+    previous_button = RosterButton(user_id, "previous", max(0, page_index - 1))
+    previous_button.item.disabled = page_index == 0
+    next_button = RosterButton(user_id, "next", min(len(pages) - 1, page_index + 1))
+    next_button.item.disabled = page_index >= len(pages) - 1
+    return component_view(previous_button, next_button)
+
+
+class RosterButton(discord.ui.DynamicItem[discord.ui.Button],
+                   template=r"davis:roster:(?P<user_id>\d+):(?P<direction>previous|next):(?P<page>\d+)"):
+    LABELS = {"previous": ("Previous", "◀️"), "next": ("Next", "▶️")}
+
+    def __init__(self, user_id, direction, page_index):
+        self.user_id = user_id
+        self.page_index = page_index
+        label, emoji = self.LABELS[direction]
+        super().__init__(discord.ui.Button(label=label, style=discord.ButtonStyle.secondary, emoji=emoji,
+                                           custom_id=f"davis:roster:{user_id}:{direction}:{page_index}"))
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["user_id"]), match["direction"], int(match["page"]))
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await is_owner_interaction(interaction, self.user_id, "Run `>ranklist` yourself to browse the roster.")
+
+    @component_latency.timed("roster")
+    async def callback(self, interaction: discord.Interaction):
+        pages = roster_pages(interaction.guild)
+        if not pages:
+            return await interaction.response.edit_message(view=None)
+        page_index = min(self.page_index, len(pages) - 1)
+        await interaction.response.edit_message(embed=roster_embed(pages, page_index),
+                                                view=roster_view(self.user_id, pages, page_index))
+
+
+bot.add_dynamic_items(PatrolButton, ArmoryPageButton, CraftingSelect, QuantitySelect, TrainButton, RosterButton)
 
 
 class PvPView(discord.ui.View):
@@ -457,7 +801,22 @@ class PvPView(discord.ui.View):
 # --- Bot Events & Tasks ---
 @bot.event
 async def on_ready():
+    global metrics_runner
     print(f"✅ Logged in as {bot.user} (ID: {bot.user.id})")
+    loop_watchdog.start()
+    if METRICS_PORT and metrics_runner is None:
+        try:
+            metrics_runner = await metrics.serve(METRICS_HOST, METRICS_PORT)
+            print(f"Metrics available at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"ERROR: Could not start the metrics endpoint: {e}")
+    if not persistence_flusher.is_running():
+        persistence_flusher.start()
+    if not cooldown_sweeper.is_running():
+        cooldown_sweeper.start()
+    role_sync.start()
+    for guild in bot.guilds:
+        guild_index.build(guild)
     if game_features_enabled:
         attack_scheduler.start()
         health_bar_updater.start()
@@ -471,66 +830,164 @@ async def on_message(message):
     if message.author == bot.user:
         return
 
-    if message.author.id == DAVIS_ID and message.content.lower() == "davis in":
-        global davis_salute_event_active, davis_saluters
-        if not davis_salute_event_active:
-            davis_salute_event_active = True
-            davis_saluters = set()
+    if message.guild and message.author.id == DAVIS_ID and message.content.lower() == "davis in":
+        state = game_states.get(message.guild.id)
+        if not state.davis_salute_event_active:
+            state.davis_salute_event_active = True
+            state.davis_saluters = set()
             await message.channel.send("Salute the President Immediately.")
             await asyncio.sleep(30)
-            davis_salute_event_active = False
+            state.davis_salute_event_active = False
             await message.channel.send(
-                f"The special salute window has closed. **{len(davis_saluters)}** soldier(s) paid their respects.")
+                f"The special salute window has closed. **{len(state.davis_saluters)}** soldier(s) paid their respects.")
 
     await bot.process_commands(message)
 
 
 @bot.event
 async def on_member_update(before: discord.Member, after: discord.Member):
-    if not game_features_enabled: return
+    if before.roles != after.roles or before.display_name != after.display_name:
+        roster_cache.update_member(after.guild.id, after.id, after.display_name,
+                                   {role.name for role in after.roles if role.name in RANK_ROLE_NAMES})
     if before.roles == after.roles: return
-    member_rank_roles = [role for role in after.roles if role.name in RANK_ROLE_NAMES]
-    if not member_rank_roles: return
-    highest_rank_owned = None
-    for rank_data in RANK_ROLES:
-        for member_role in member_rank_roles:
-            if rank_data["name"] == member_role.name:
-                highest_rank_owned = rank_data
+    rank_index.invalidate(after)
+    combat_profiles.invalidate(after.id)
+    if not game_features_enabled: return
+    highest_rank_owned = rank_index.member_rank(after)
     if not highest_rank_owned: return
     baseline_honor = highest_rank_owned["honor"]
     user_id = str(after.id)
-    current_honor = user_honor.get(user_id, 0)
+    current_honor = get_honor(user_id)
     if current_honor < baseline_honor:
-        user_honor[user_id] = baseline_honor
-        save_data(user_honor, HONOR_FILE)
+        set_honor(user_id, baseline_honor)
         print(
             f"Updated {after.display_name}'s Honor to {baseline_honor} to match their highest role: '{highest_rank_owned['name']}'.")
-    await check_and_update_roles(after)
+    queue_role_update(after)
+
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    rank_index.invalidate(member)
+    combat_profiles.invalidate(member.id)
+    roster_cache.remove_member(member.guild.id, member.id)
+
+
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    guild_index.build(guild)
+
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    guild_index.forget(guild)
+    game_states.discard(guild.id)
+    roster_cache.forget(guild.id)
+
+
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    guild_index.invalidate_roles(role.guild)
+
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    if before.name != after.name:
+        guild_index.invalidate_roles(after.guild)
+        rank_index.clear()
+        combat_profiles.clear()
+        roster_cache.forget(after.guild.id)
+
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    guild_index.invalidate_roles(role.guild)
+    roster_cache.forget(role.guild.id)
+    # Members silently lose a deleted role without an on_member_update, so cached ranks may be stale.
+    rank_index.clear()
+    combat_profiles.clear()
+
+
+@bot.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    guild_index.invalidate_channels(channel.guild)
+
+
+@bot.event
+async def on_guild_channel_update(before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+    if before.name != after.name:
+        guild_index.invalidate_channels(after.guild)
+
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    guild_index.invalidate_channels(channel.guild)
+
+
+# Running attacks, referenced here so they aren't garbage collected before they finish.
+attack_tasks = set()
+
+
+def start_attack(channel):
+    task = asyncio.create_task(initiate_attack(channel))
+    attack_tasks.add(task)
+    task.add_done_callback(attack_tasks.discard)
 
 
 @tasks.loop(minutes=1)
 async def attack_scheduler():
-    global attack_in_progress
     if not game_features_enabled: return
-    if not attack_in_progress and random.randint(1, 120) == 1:
-        channel = bot.get_channel(ATTACK_CHANNEL_ID)
+    for guild in bot.guilds:
+        state = game_states.get(guild.id)
+        if state.attack_in_progress or not engine.attack_due(): continue
+        channel_id = state.attack_channel_id or ATTACK_CHANNEL_ID
+        channel = guild.get_channel(channel_id)
         if channel:
-            await initiate_attack(channel)
+            start_attack(channel)
         else:
-            print(f"Error: Attack channel with ID {ATTACK_CHANNEL_ID} not found.")
+            print(f"Error: Attack channel with ID {channel_id} not found in {guild.name}.")
 
 
 @tasks.loop(seconds=2)
 async def health_bar_updater():
-    global boss_health_dirty, boss_event_message, boss_hp, boss_max_hp
-    if boss_event_active and boss_health_dirty and boss_event_message:
-        try:
-            original_embed = boss_event_message.embeds[0]
-            original_embed.set_field_at(0, name="Health", value=create_health_bar(boss_hp, boss_max_hp), inline=False)
-            await boss_event_message.edit(embed=original_embed)
-            boss_health_dirty = False
-        except discord.HTTPException as e:
-            print(f"Failed to update health bar: {e}")
+    for state in game_states:
+        if not state.boss_event_active: continue
+        apply_boss_damage(state)
+        bucket = health_bar_bucket(state.boss_hp, state.boss_max_hp)
+        if state.boss_event_message and bucket != state.boss_rendered_bucket:
+            try:
+                original_embed = state.boss_event_message.embeds[0]
+                original_embed.set_field_at(0, name="Health", value=create_health_bar(state.boss_hp, state.boss_max_hp),
+                                            inline=False)
+                with rest_latency.time("boss_message_edit"):
+                    await state.boss_event_message.edit(embed=original_embed)
+                state.boss_rendered_bucket = bucket
+            except discord.HTTPException as e:
+                print(f"Failed to update health bar: {e}")
+
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.perf_started = time.perf_counter()
+
+
+@bot.after_invoke
+async def record_command_latency(ctx):
+    command_latency.observe(ctx.command.qualified_name, time.perf_counter() - ctx.perf_started)
+
+
+@tasks.loop(minutes=5)
+async def cooldown_sweeper():
+    cooldowns.sweep()
+
+
+@tasks.loop(seconds=PERSIST_INTERVAL_SECONDS)
+async def persistence_flusher():
+    await store.flush()
+
+
+@persistence_flusher.after_loop
+async def flush_on_stop():
+    await store.flush()
 
 
 @attack_scheduler.before_loop
@@ -539,63 +996,76 @@ async def before_tasks(): await bot.wait_until_ready()
 
 
 # --- Game Logic ---
+def apply_boss_damage(state):
+    """Applies the damage queued by >hit since the last tick in one step."""
+    if state.boss_pending_damage:
+        state.boss_hp -= state.boss_pending_damage
+        state.boss_pending_damage = 0
+
+
 async def resolve_attack(channel: discord.TextChannel):
-    global attack_in_progress, defenders
+    state = game_states.get(channel.guild.id)
+    defenders = state.defenders
     if not defenders:
         await channel.send("The attack was undefended! Davis has fallen into chaos.")
-        attack_in_progress = False
+        state.attack_in_progress = False
         return
 
-    defense_strength = 0;
-    defender_details = [];
     guild = channel.guild
     num_defenders = len(defenders)
-
-    for user_id in defenders:
-        member = guild.get_member(user_id)
-        if member:
-            skills = get_user_skills(user_id)
-            member_rank_weight = 1
-            for rank_info in reversed(RANK_ROLES):
-                for role in member.roles:
-                    if role.name == rank_info["name"]: member_rank_weight = rank_info["weight"]; break
-                if member_rank_weight > 1: break
-            defense_strength += (member_rank_weight + skills['agility'])
-            defender_details.append(f"{member.display_name}")
-
-    difficulty_mod = max(0.8, 1.5 - (num_defenders * 0.05))
-    attack_strength = random.randint(int(defense_strength * 0.7), int(defense_strength * difficulty_mod)) + 5
+    members = [member for member in map(guild.get_member, defenders) if member]
+    defense_strength, attack_strength, honor_reward = engine.resolve_attack(list(map(combat_profiles.get, members)),
+                                                                           num_defenders)
 
     embed = discord.Embed(title="Battle Report", color=discord.Color.dark_red())
-    embed.add_field(name=f"Defenders ({num_defenders})", value="\n".join(defender_details) or "None", inline=False)
+    embed.add_field(name=f"Defenders ({num_defenders})", value=name_list([member.display_name for member in members]),
+                    inline=False)
     embed.add_field(name="Total Defense Strength", value=str(defense_strength), inline=True)
     embed.add_field(name="Attack Strength", value=str(attack_strength), inline=True)
 
     if defense_strength >= attack_strength:
         embed.description = "🎉 **VICTORY!** The defenders have successfully repelled the attack!";
         embed.color = discord.Color.green()
-        honor_reward = random.randint(50, 100)
         embed.set_footer(text=f"Each defender has been awarded {honor_reward} Honor for their bravery.")
-        for user_id in defenders:
-            str_id = str(user_id);
-            user_honor[str_id] = user_honor.get(str_id, 0) + honor_reward
-        save_data(user_honor, HONOR_FILE)
-        for user_id in defenders:
-            member = guild.get_member(user_id)
-            if member: await check_and_update_roles(member)
+        add_honor_many(defenders, honor_reward)
+        for member in members:
+            queue_role_update(member)
     else:
         embed.description = "☠️ **DEFEAT!** The attack was too strong and broke through the defenses.";
         embed.color = discord.Color.red()
     await channel.send(embed=embed)
-    attack_in_progress = False;
-    defenders = set()
+    state.attack_in_progress = False;
+    state.defenders = set()
+
+
+async def resolve_patrol_attack(interaction: discord.Interaction):
+    member = interaction.user
+    author_id = str(member.id)
+    honor_reward = engine.patrol_fight(combat_profiles.get(member))
+    if honor_reward:
+        add_honor(author_id, honor_reward)
+        result_embed = discord.Embed(title="VICTORY!",
+                                     description=f"You bravely fought and defeated the emos! You earned {honor_reward} Honor for your valor.",
+                                     color=discord.Color.green())
+        await interaction.response.edit_message(embed=result_embed, view=None)
+        if add_patrol_win(author_id) >= 100:
+            hunter_role = guild_index.role(interaction.guild, EMO_HUNTER_ROLE_NAME)
+            if hunter_role and not member.get_role(hunter_role.id):
+                await member.add_roles(hunter_role, reason="Achieved Emo Hunter status")
+                await interaction.channel.send(
+                    f"Congratulations, {member.mention}! For winning 100 patrol encounters, you have been awarded the **{EMO_HUNTER_ROLE_NAME}** role!")
+    else:
+        result_embed = discord.Embed(title="DEFEAT!",
+                                     description="The emos were stronger than they looked. You were defeated but managed to escape. You earned no Honor.",
+                                     color=discord.Color.red())
+        await interaction.response.edit_message(embed=result_embed, view=None)
 
 
 async def initiate_attack(channel: discord.TextChannel):
-    global attack_in_progress, defenders
-    attack_in_progress = True;
-    defenders = set()
-    notification_role = discord.utils.get(channel.guild.roles, name=NOTIFICATION_ROLE_NAME)
+    state = game_states.get(channel.guild.id)
+    state.attack_in_progress = True;
+    state.defenders = set()
+    notification_role = guild_index.role(channel.guild, NOTIFICATION_ROLE_NAME)
     ping_message = f"{notification_role.mention}" if notification_role else ""
     embed = discord.Embed(title="🚨 INCOMING ATTACK! 🚨",
                           description="An enemy force is approaching Davis! All personnel must defend!",
@@ -609,33 +1079,39 @@ async def initiate_attack(channel: discord.TextChannel):
 
 
 async def resolve_world_boss(channel: discord.TextChannel):
-    global boss_event_active, boss_hp, boss_participants, boss_title, boss_event_message
+    state = game_states.get(channel.guild.id)
+    apply_boss_damage(state)
+    boss_title = state.boss_title
+    boss_participants = list(state.boss_damage_ledger)
     final_embed = discord.Embed(color=discord.Color.gold())
     final_embed.set_author(name=boss_title)
-    if boss_hp <= 0:
+    if state.boss_damage_ledger:
+        top_damage = heapq.nlargest(5, state.boss_damage_ledger.items(), key=lambda item: item[1])
+        final_embed.add_field(name="Top Damage", value="\n".join(
+            f"**{i + 1}.** <@{user_id}>: {damage} damage" for i, (user_id, damage) in enumerate(top_damage)),
+                              inline=False)
+    if state.boss_hp <= 0:
         final_embed.title = f"🎉 WORLD BOSS DEFEATED! 🎉";
         final_embed.description = f"**{boss_title}** has been vanquished by the brave soldiers of Davis!"
-        honor_reward = random.randint(250, 500)
+        honor_reward = engine.boss_reward()
         final_embed.set_footer(
             text=f"All {len(boss_participants)} participants have been awarded {honor_reward} Honor!")
+        add_honor_many(boss_participants, honor_reward)
         for user_id in boss_participants:
-            str_id = str(user_id);
-            user_honor[str_id] = user_honor.get(str_id, 0) + honor_reward
             member = channel.guild.get_member(user_id)
-            if member: await check_and_update_roles(member)
-        save_data(user_honor, HONOR_FILE)
+            if member: queue_role_update(member)
     else:
         final_embed.title = f"☠️ WORLD BOSS SURVIVED ☠️";
-        final_embed.description = f"**{boss_title}** was too powerful and escaped. It remains with {boss_hp} HP."
+        final_embed.description = f"**{boss_title}** was too powerful and escaped. It remains with {state.boss_hp} HP."
         final_embed.set_footer(text="No Honor was awarded. Better luck next time!")
-    if boss_event_message:
+    if state.boss_event_message:
         try:
-            await boss_event_message.edit(embed=final_embed, view=None)
+            await state.boss_event_message.edit(embed=final_embed, view=None)
         except discord.NotFound:
             await channel.send(embed=final_embed)
-    boss_event_active = False;
-    boss_participants = set();
-    boss_event_message = None
+    state.boss_event_active = False;
+    state.boss_damage_ledger = {};
+    state.boss_event_message = None
 
 
 # --- Commands ---
@@ -674,10 +1150,12 @@ async def help_command(ctx):
             "**`>pvp @user [wager]`**: Challenge a user to a duel for Honor.\n"
             "**`>pvpaccept`**: Accept a duel invitation.\n"
             "**`>killstreak`**: View the PvP killstreak leaderboard.\n"
+            "**`>top [page]`**: View the Honor leaderboard and your position.\n"
             "**`>train`**: Opens the skill training menu (1 min cooldown).\n"
             "**`>patrol`**: Go on patrol for a chance at Honor or an encounter (cooldown reduced by Endurance).\n"
-            "**`>scavenge`**: Search for crafting materials (cooldown reduced by Endurance).\n"
+            "**`>scavenge [runs]`**: Search for crafting materials (cooldown reduced by Endurance). Unused runs bank up to 10; give a number of runs to spend them at once.\n"
             "**`>armory [@user]`**: Check your interactive inventory and crafting menu.\n"
+            "**`>craft [\"item\"] [amount|max]`**: Craft items in bulk, or see how many of each you can craft.\n"
             "**`>defend`**: Join the defense during a server-wide attack.\n"
             "**`>hit`**: Attack the world boss during a boss event (2s cooldown).\n"
             "**`>ranklist`**: Shows a list of all members in each rank."
@@ -694,7 +1172,7 @@ async def help_command(ctx):
 @bot.command()
 @commands.is_owner()
 async def announce(ctx, *, message: str):
-    channel = discord.utils.get(ctx.guild.channels, name=ANNOUNCEMENT_CHANNEL_NAME)
+    channel = guild_index.channel(ctx.guild, ANNOUNCEMENT_CHANNEL_NAME)
     if not channel: return await ctx.reply(f"I couldn't find the `#{ANNOUNCEMENT_CHANNEL_NAME}` channel.")
     embed = discord.Embed(title="📢 Announcement", description=message, color=discord.Color.blue(),
                           timestamp=datetime.datetime.now())
@@ -719,28 +1197,20 @@ async def say(ctx, channel: discord.TextChannel, *, message: str):
 @bot.command()
 @commands.is_owner()
 async def give(ctx, member: discord.Member, item_name: str, amount: int = 1):
-    author_id = str(member.id)
     normalized_item_name = item_name.replace("_", " ").title()
-    if author_id not in user_armory:
-        user_armory[author_id] = {"materials": {}, "crafted_items": {}}
     is_material = False
     for mat in MATERIALS:
         if mat["name"] == normalized_item_name:
-            if "materials" not in user_armory[author_id]: user_armory[author_id]["materials"] = {}
-            user_armory[author_id]["materials"][normalized_item_name] = user_armory[author_id]["materials"].get(
-                normalized_item_name, 0) + amount
+            add_materials(member.id, {normalized_item_name: amount})
             is_material = True
             break
     is_item = False
     if not is_material:
         if normalized_item_name in RECIPES:
-            if "crafted_items" not in user_armory[author_id]: user_armory[author_id]["crafted_items"] = {}
-            user_armory[author_id]["crafted_items"][normalized_item_name] = user_armory[author_id]["crafted_items"].get(
-                normalized_item_name, 0) + amount
+            add_crafted_items(member.id, {normalized_item_name: amount})
             is_item = True
     if not is_material and not is_item:
         return await ctx.reply(f"Could not find an item or material named `{normalized_item_name}`.")
-    save_data(user_armory, ARMORY_FILE)
     await ctx.reply(f"Gave **{amount}x {normalized_item_name}** to {member.mention}.")
 
 
@@ -750,17 +1220,54 @@ async def setstat(ctx, member: discord.Member, skill: str, level: int):
     """Sets a user's skill to a specific level."""
     skill = skill.lower()
     user_id = str(member.id)
-    skills = get_user_skills(user_id)
-    if skill not in skills:
+    if skill not in SKILL_NAMES:
         return await ctx.reply(f"Invalid skill. Use one of: `strength`, `agility`, `intelligence`, `endurance`.")
     if not 1 <= level <= 100:
         return await ctx.reply("Skill level must be between 1 and 100.")
 
-    skills[skill] = level
-    save_data(user_skills, SKILLS_FILE)
+    set_skill(user_id, skill, level)
     await ctx.reply(f"Set {member.mention}'s **{skill.title()}** to Level {level}.")
 
 
+@bot.command()
+@commands.is_owner()
+async def rolesync(ctx):
+    """Shows the state of the background rank role sync queue."""
+    await ctx.reply(f"Role sync queue: **{role_sync.depth}** pending, {role_sync.processed} processed, "
+                    f"{role_sync.edits} role edits issued.")
+
+
+@bot.command()
+@commands.is_owner()
+async def perf(ctx):
+    """Shows call counts, latency percentiles and errors for commands, components, storage and REST calls."""
+    embed = discord.Embed(title="Performance", color=discord.Color.dark_teal())
+    for title, metric in (("Commands", command_latency), ("Components", component_latency),
+                          ("Storage", persist_latency), ("REST", rest_latency)):
+        rows = sorted(metric.series.items(), key=lambda item: item[1].sum, reverse=True)
+        lines = [f"{name:<16}{h.count:>7}{h.sum / h.count * 1000:>9.1f}{h.quantile(0.5) * 1000:>8g}"
+                 f"{h.quantile(0.95) * 1000:>8g}{metric.error_count(name):>6}" for name, h in rows[:12]]
+        if lines:
+            header = f"{'':<16}{'calls':>7}{'avg ms':>9}{'p50':>8}{'p95':>8}{'errs':>6}"
+            embed.add_field(name=title, value="```\n" + "\n".join([header] + lines) + "\n```", inline=False)
+    if command_rejections.values:
+        rejected = ", ".join(f"{count}x {name}" for name, count in command_rejections.most_common(6))
+        embed.add_field(name="Rejected Commands", value=f"Cooldowns, checks and bad input: {rejected}", inline=False)
+    lag = loop_lag.series.get("main")
+    if lag:
+        blockers = "\n".join(f"{count}x {culprit}" for culprit, count in loop_stalls.most_common(3))
+        embed.add_field(name="Event Loop", value=f"Lag p50 {lag.quantile(0.5) * 1000:g} ms, p95 "
+                                                 f"{lag.quantile(0.95) * 1000:g} ms, max "
+                                                 f"{loop_watchdog.max_lag * 1000:.0f} ms\n"
+                                                 + (blockers or "No stalls recorded."), inline=False)
+    if not embed.fields:
+        embed.description = "Nothing has been recorded yet."
+    endpoint = f"http://{METRICS_HOST}:{METRICS_PORT}/metrics" if metrics_runner else "disabled"
+    embed.set_footer(text=f"Role sync pending: {role_sync.depth} | Unflushed changes: {store.pending} | "
+                          f"Prometheus: {endpoint}")
+    await ctx.reply(embed=embed)
+
+
 @bot.command()
 @commands.cooldown(1, 300, commands.BucketType.default)
 async def ping(ctx):
@@ -790,104 +1297,53 @@ async def patrol(ctx):
     if not game_features_enabled: return
     author_id = str(ctx.author.id)
     skills = get_user_skills(author_id)
-    cooldown_seconds = 60 - (skills['endurance'] * 0.5)
-    cooldown_seconds = max(10, cooldown_seconds)
-
-    current_time = datetime.datetime.now()
-    if author_id in patrol_cooldowns:
-        time_since = current_time - patrol_cooldowns[author_id]
-        if time_since.total_seconds() < cooldown_seconds:
-            return await ctx.reply(
-                f"You need to rest. You can go on patrol again in {cooldown_seconds - time_since.total_seconds():.1f} seconds.")
-    patrol_cooldowns[author_id] = current_time
-
-    if random.random() > 0.5:
-        honor_reward = random.randint(5, 10);
-        user_honor[author_id] = user_honor.get(author_id, 0) + honor_reward
-        save_data(user_honor, HONOR_FILE);
-        await check_and_update_roles(ctx.author)
+    remaining = patrol_cooldowns.try_acquire(ctx.author.id, endurance_cooldown(skills.endurance))
+    if remaining:
+        return await ctx.reply(f"You need to rest. You can go on patrol again in {remaining:.1f} seconds.")
+
+    honor_reward = engine.patrol()
+    if honor_reward is not None:
+        add_honor(author_id, honor_reward)
+        queue_role_update(ctx.author)
         return await ctx.reply(f"Your patrol was uneventful. You secured the area and gained {honor_reward} Honor.")
 
     embed = discord.Embed(title="Patrol Encounter!",
                           description="You've encountered a band of violent emos! They look hostile.",
                           color=discord.Color.dark_purple())
     embed.set_footer(text="What will you do?")
-    view = PatrolEncounterView(ctx.author)
-    message = await ctx.reply(embed=embed, view=view)
-    await view.wait()
-    for item in view.children: item.disabled = True
-    await message.edit(view=view)
-    if view.result in ("retreat", "timeout"):
-        result_embed = discord.Embed(title="Patrol Ended", description="You chose to retreat, avoiding a risky fight.",
-                                     color=discord.Color.light_grey())
-        return await message.edit(embed=result_embed)
-    if view.result == "attack":
-        member_rank_weight = 1
-        for rank_info in reversed(RANK_ROLES):
-            for role in ctx.author.roles:
-                if role.name == rank_info["name"]: member_rank_weight = rank_info["weight"]; break
-            if member_rank_weight > 1: break
-        win_chance = min(0.30 + (member_rank_weight * 0.05), 0.95)
-        if random.random() < win_chance:
-            honor_reward = random.randint(75, 150);
-            user_honor[author_id] = user_honor.get(author_id, 0) + honor_reward
-            save_data(user_honor, HONOR_FILE)
-            stats = get_user_stats(author_id);
-            stats["patrol_wins"] += 1
-            save_data(user_stats, STATS_FILE)
-            if stats["patrol_wins"] >= 100:
-                hunter_role = discord.utils.get(ctx.guild.roles, name=EMO_HUNTER_ROLE_NAME)
-                if hunter_role and hunter_role not in ctx.author.roles:
-                    await ctx.author.add_roles(hunter_role, reason="Achieved Emo Hunter status")
-                    await ctx.send(
-                        f"Congratulations, {ctx.author.mention}! For winning 100 patrol encounters, you have been awarded the **{EMO_HUNTER_ROLE_NAME}** role!")
-            result_embed = discord.Embed(title="VICTORY!",
-                                         description=f"You bravely fought and defeated the emos! You earned {honor_reward} Honor for your valor.",
-                                         color=discord.Color.green())
-            await message.edit(embed=result_embed)
-        else:
-            result_embed = discord.Embed(title="DEFEAT!",
-                                         description="The emos were stronger than they looked. You were defeated but managed to escape. You earned no Honor.",
-                                         color=discord.Color.red())
-            await message.edit(embed=result_embed)
+    await ctx.reply(embed=embed, view=patrol_view(ctx.author.id))
 
 
 @bot.command()
-async def scavenge(ctx):
+async def scavenge(ctx, runs: int = None):
     if not game_features_enabled: return
     author_id = str(ctx.author.id)
     skills = get_user_skills(author_id)
-    cooldown_seconds = 60 - (skills['endurance'] * 0.5)
-    cooldown_seconds = max(10, cooldown_seconds)
-
-    current_time = datetime.datetime.now()
-    if author_id in scavenge_cooldowns:
-        time_since = current_time - scavenge_cooldowns[author_id]
-        if time_since.total_seconds() < cooldown_seconds:
+    cooldown = endurance_cooldown(skills.endurance)
+    if runs is None:
+        remaining = scavenge_run_cooldowns.remaining(ctx.author.id)
+        if remaining:
             return await ctx.reply(
-                f"You've already picked this area clean. You can scavenge again in {cooldown_seconds - time_since.total_seconds():.1f} seconds.")
-    scavenge_cooldowns[author_id] = current_time
-
-    if author_id not in user_armory:
-        user_armory[author_id] = {"materials": {}, "crafted_items": {}}
-
-    num_items_found = random.randint(2, 4) + (skills['intelligence'] // 10)
-
-    found_materials = {};
-    materials_list = [m["name"] for m in MATERIALS];
-    weights = [MATERIAL_RARITY_WEIGHTS[m["rarity"]] for m in MATERIALS]
-    found_items = random.choices(materials_list, weights=weights, k=num_items_found)
-    for item_name in found_items:
-        found_materials[item_name] = found_materials.get(item_name, 0) + 1
-        if "materials" not in user_armory[author_id]: user_armory[author_id]["materials"] = {}
-        user_armory[author_id]["materials"][item_name] = user_armory[author_id]["materials"].get(item_name, 0) + 1
-    save_data(user_armory, ARMORY_FILE)
-    material_emojis = {m["name"]: m["emoji"] for m in MATERIALS}
+                f"You've already picked this area clean. You can scavenge again in {remaining:.1f} seconds.")
+    spent, next_charge = scavenge_cooldowns.take(ctx.author.id, max(1, min(runs or 1, SCAVENGE_MAX_CHARGES)),
+                                                 cooldown)
+    if not spent:
+        return await ctx.reply(
+            f"You've already picked this area clean. You can scavenge again in {next_charge:.1f} seconds.")
+    if runs is None:
+        scavenge_run_cooldowns.try_acquire(ctx.author.id, cooldown)
+
+    found_materials = engine.scavenge(spent, skills.intelligence)
+    add_materials(author_id, found_materials)
     description = "\n".join(
-        [f"{material_emojis[name]} **{name}** x{amount}" for name, amount in found_materials.items()])
+        [f"{MATERIAL_EMOJIS[name]} **{name}** x{amount}" for name, amount in found_materials.items()])
     embed = discord.Embed(title="Scavenge Successful!", description=description, color=discord.Color.dark_green())
     embed.set_author(name=f"{ctx.author.display_name}'s Haul")
-    embed.set_footer(text="Your findings have been added to your armory.")
+    if spent > 1:
+        embed.set_footer(text=f"{spent} scavenging runs added to your armory. "
+                              f"{scavenge_cooldowns.charges(ctx.author.id, endurance_cooldown(skills.endurance))} left in reserve.")
+    else:
+        embed.set_footer(text="Your findings have been added to your armory.")
     await ctx.reply(embed=embed)
 
 
@@ -895,28 +1351,59 @@ async def scavenge(ctx):
 async def armory(ctx, member: discord.Member = None):
     if not game_features_enabled: return
     target_member = member or ctx.author
-    view = ArmoryView(target_member)
-    embed = await view.generate_embed()
-    await ctx.reply(embed=embed, view=view)
+    await ctx.reply(embed=armory_embed(target_member, "inventory"),
+                    view=armory_view(target_member.id, "inventory", "1"))
+
+
+@bot.command()
+async def craft(ctx, item_name: str = None, quantity: str = "1"):
+    if not game_features_enabled: return
+    author_id = str(ctx.author.id)
+    if item_name is None:
+        user_intel = get_user_skills(author_id).intelligence
+        plan = [f"{RECIPES[name]['emoji']} **{name}**: {count}" for name, count in craft_plan(author_id).items()
+                if count and user_intel >= RECIPES[name]['intelligence_req']]
+        embed = discord.Embed(title="Crafting Planner", color=discord.Color.dark_gray(),
+                              description="\n".join(plan) or "You don't have the materials to craft anything yet.")
+        embed.set_footer(text='Most of each item you can craft right now. Use >craft "Item Name" [amount|max].')
+        return await ctx.reply(embed=embed)
+
+    item_name = RECIPE_NAMES.get(item_name.replace("_", " ").lower())
+    if item_name is None:
+        return await ctx.reply("That isn't a craftable item. Use `>craft` to see what you can make.")
+    if quantity.lower() == "max":
+        quantity = max(1, max_craftable(get_user_armory(author_id), RECIPES[item_name]))
+    elif quantity.isdigit() and int(quantity) > 0:
+        quantity = int(quantity)
+    else:
+        return await ctx.reply("The amount must be a positive number or `max`.")
+
+    error = craft_error(author_id, item_name, quantity)
+    if error:
+        return await ctx.reply(error)
+    craft_item(author_id, item_name, quantity)
+    await ctx.reply(f"You successfully crafted {quantity}x {RECIPES[item_name]['emoji']} **{item_name}**!")
 
 
 @bot.command()
 @commands.is_owner()
 async def worldboss(ctx, *, params: str):
     if not game_features_enabled: return
-    global boss_event_active, boss_hp, boss_max_hp, boss_title, boss_participants, boss_event_message
-    if boss_event_active: return await ctx.reply("A world boss event is already in progress.")
+    state = game_states.get(ctx.guild.id)
+    if state.boss_event_active: return await ctx.reply("A world boss event is already in progress.")
     try:
         title, description, health_str = [p.strip() for p in params.split('|')]
         health = int(health_str)
     except ValueError:
         return await ctx.reply("Invalid format. Use: `>worldboss Title | Description | Health`")
-    boss_event_active = True;
-    boss_hp = health;
-    boss_max_hp = health
-    boss_title = title;
-    boss_participants = set()
-    notification_role = discord.utils.get(ctx.guild.roles, name=NOTIFICATION_ROLE_NAME)
+    state.boss_event_active = True;
+    state.boss_hp = health;
+    state.boss_max_hp = health
+    state.boss_title = title;
+    state.boss_damage_ledger = {};
+    state.boss_pending_damage = 0
+    state.boss_rendered_bucket = health_bar_bucket(health, health)
+    notification_role = guild_index.role(ctx.guild, NOTIFICATION_ROLE_NAME)
     if not notification_role:
         await ctx.reply(
             f"⚠️ **Warning:** Could not find the role `{NOTIFICATION_ROLE_NAME}`. The event will start without a ping.",
@@ -926,10 +1413,10 @@ async def worldboss(ctx, *, params: str):
         ping_message = notification_role.mention
     embed = discord.Embed(title=f"🚨 WORLD BOSS EVENT! 🚨", description=description, color=discord.Color.magenta())
     embed.set_author(name=title)
-    embed.add_field(name="Health", value=create_health_bar(boss_hp, boss_max_hp), inline=False)
+    embed.add_field(name="Health", value=create_health_bar(state.boss_hp, state.boss_max_hp), inline=False)
     embed.add_field(name="Time Limit", value="60 seconds", inline=True)
     embed.add_field(name="How to Fight", value="Type `>hit` to attack!", inline=True)
-    boss_event_message = await ctx.send(ping_message, embed=embed)
+    state.boss_event_message = await ctx.send(ping_message, embed=embed)
     await asyncio.sleep(60)
     await resolve_world_boss(ctx.channel)
 
@@ -938,41 +1425,31 @@ async def worldboss(ctx, *, params: str):
 @commands.cooldown(1, 2, commands.BucketType.user)
 async def hit(ctx):
     if not game_features_enabled: return
-    global boss_event_active, boss_hp, boss_participants, boss_health_dirty
-    if not boss_event_active:
+    state = game_states.get(ctx.guild.id)
+    if not state.boss_event_active:
         ctx.command.reset_cooldown(ctx)
         return
-    boss_participants.add(ctx.author.id)
-    skills = get_user_skills(ctx.author.id)
-    member_rank_weight = 1
-    for rank_info in reversed(RANK_ROLES):
-        for role in ctx.author.roles:
-            if role.name == rank_info["name"]: member_rank_weight = rank_info["weight"]; break
-        if member_rank_weight > 1: break
-
-    weapon_bonus = 0
-    user_items = user_armory.get(str(ctx.author.id), {}).get("crafted_items", {})
-    for item_name, recipe in RECIPES.items():
-        if recipe.get("type") == "weapon" and user_items.get(item_name, 0) > 0:
-            weapon_bonus = max(weapon_bonus, recipe.get("weight_bonus", 0))
-
-    total_weight = member_rank_weight + weapon_bonus
-    damage = (random.randint(5, 15) + total_weight + skills['strength'])
-    boss_hp -= damage
-    boss_health_dirty = True
+    profile = combat_profiles.get(ctx.author)
+    damage = engine.hit_damage(profile)
+    first_hit = ctx.author.id not in state.boss_damage_ledger
+    state.boss_damage_ledger[ctx.author.id] = state.boss_damage_ledger.get(ctx.author.id, 0) + damage
+    state.boss_pending_damage += damage
 
-    await ctx.message.add_reaction('⚔️')
+    # Only the first hit gets a reaction so a busy fight doesn't turn into one REST call per >hit.
+    if first_hit:
+        await ctx.message.add_reaction('⚔️')
 
 
 @bot.command()
 async def defend(ctx):
     if not game_features_enabled: return
-    global attack_in_progress, defenders
-    if not attack_in_progress: return await ctx.reply("There is no attack to defend against right now.",
-                                                      delete_after=10)
-    if ctx.author.id in defenders: return await ctx.reply("You are already in the defensive line!", delete_after=10)
+    state = game_states.get(ctx.guild.id)
+    if not state.attack_in_progress: return await ctx.reply("There is no attack to defend against right now.",
+                                                            delete_after=10)
+    if ctx.author.id in state.defenders: return await ctx.reply("You are already in the defensive line!",
+                                                                delete_after=10)
 
-    defenders.add(ctx.author.id)
+    state.defenders.add(ctx.author.id)
     await ctx.message.add_reaction("🛡️")
 
 
@@ -980,37 +1457,43 @@ async def defend(ctx):
 @commands.is_owner()
 async def forceattack(ctx):
     if not game_features_enabled: return
-    if attack_in_progress: return await ctx.reply("An attack is already in progress.")
+    if game_states.get(ctx.guild.id).attack_in_progress: return await ctx.reply("An attack is already in progress.")
     await ctx.reply("Forcing an attack now...");
-    bot.loop.create_task(initiate_attack(ctx.channel))
+    start_attack(ctx.channel)
+
+
+@bot.command()
+@commands.is_owner()
+async def attackchannel(ctx):
+    """Makes the current channel this server's target for scheduled attacks."""
+    game_states.get(ctx.guild.id).attack_channel_id = ctx.channel.id
+    try:
+        save_guild_settings()
+    except OSError as e:
+        print(f"ERROR: Failed to save {GUILD_SETTINGS_FILE}: {e}")
+    await ctx.reply(f"Scheduled attacks in this server will now happen in {ctx.channel.mention}.")
 
 
 @bot.command()
 async def salute(ctx, member: discord.Member):
-    global davis_salute_event_active, davis_saluters
     if not game_features_enabled: return
+    state = game_states.get(ctx.guild.id)
 
-    if davis_salute_event_active and member.id == DAVIS_ID:
-        if ctx.author.id in davis_saluters:
+    if state.davis_salute_event_active and member.id == DAVIS_ID:
+        if ctx.author.id in state.davis_saluters:
             return await ctx.reply("You have already saluted the President during this event.", delete_after=10)
-        davis_saluters.add(ctx.author.id)
+        state.davis_saluters.add(ctx.author.id)
         honor_to_give = 50
         await ctx.message.add_reaction('🫡')
     else:
-        author_id = str(ctx.author.id)
-        current_time = datetime.datetime.now()
         if ctx.author == member: return await ctx.reply("You cannot salute yourself.")
-        if author_id in salute_cooldowns:
-            if current_time - salute_cooldowns[author_id] < datetime.timedelta(minutes=5):
-                return await ctx.reply("You can only salute once every 5 minutes.")
-        salute_cooldowns[author_id] = current_time
-        honor_to_give = random.randint(5, 15)
+        if salute_cooldowns.try_acquire(ctx.author.id):
+            return await ctx.reply("You can only salute once every 5 minutes.")
+        honor_to_give = engine.salute_honor()
         await ctx.send(f"o7 {ctx.author.mention} salutes {member.mention}! They have gained {honor_to_give} Honor.")
 
-    member_id = str(member.id)
-    user_honor[member_id] = user_honor.get(member_id, 0) + honor_to_give
-    save_data(user_honor, HONOR_FILE)
-    await check_and_update_roles(member)
+    add_honor(member.id, honor_to_give)
+    queue_role_update(member)
 
 
 @bot.command()
@@ -1020,20 +1503,10 @@ async def honor(ctx, member: discord.Member = None):
         member = ctx.author
 
     member_id = str(member.id)
-    current_honor = user_honor.get(member_id, 0)
-
-    current_rank_data = None
-    next_rank_data = None
-    current_rank_index = -1
-    for i, rank in enumerate(RANK_ROLES):
-        if current_honor >= rank["honor"]:
-            current_rank_data = rank
-            current_rank_index = i
-        else:
-            break
+    current_honor = get_honor(member_id)
 
-    if current_rank_index != -1 and current_rank_index + 1 < len(RANK_ROLES):
-        next_rank_data = RANK_ROLES[current_rank_index + 1]
+    current_rank_data = rank_index.rank_for_honor(current_honor)
+    next_rank_data = rank_index.next_rank(current_rank_data) if current_rank_data else None
 
     embed = discord.Embed(color=discord.Color.blue())
     embed.set_author(name=f"{member.display_name}'s Profile", icon_url=member.display_avatar.url)
@@ -1075,25 +1548,19 @@ async def stats(ctx, member: discord.Member = None):
     skills = get_user_skills(member.id)
     embed = discord.Embed(title="Skill Profile", color=discord.Color.dark_orange())
     embed.set_author(name=f"{member.display_name}'s Stats", icon_url=member.display_avatar.url)
-    embed.add_field(name="💪 Strength", value=f"Level {skills['strength']}", inline=True)
-    embed.add_field(name="⚡ Agility", value=f"Level {skills['agility']}", inline=True)
-    embed.add_field(name="🧠 Intelligence", value=f"Level {skills['intelligence']}", inline=True)
-    embed.add_field(name="❤️ Endurance", value=f"Level {skills['endurance']}", inline=True)
+    embed.add_field(name="💪 Strength", value=f"Level {skills.strength}", inline=True)
+    embed.add_field(name="⚡ Agility", value=f"Level {skills.agility}", inline=True)
+    embed.add_field(name="🧠 Intelligence", value=f"Level {skills.intelligence}", inline=True)
+    embed.add_field(name="❤️ Endurance", value=f"Level {skills.endurance}", inline=True)
     await ctx.reply(embed=embed)
 
 
 @bot.command()
 async def train(ctx):
     if not game_features_enabled: return
-    author_id = str(ctx.author.id)
-    current_time = datetime.datetime.now()
-
-    if author_id in train_cooldowns:
-        if current_time - train_cooldowns[author_id] < datetime.timedelta(minutes=1):
-            return await ctx.reply(
-                "You are still tired from your last training session. You can train again in 1 minute.")
-
-    train_cooldowns[author_id] = current_time
+    if train_cooldowns.try_acquire(ctx.author.id):
+        return await ctx.reply(
+            "You are still tired from your last training session. You can train again in 1 minute.")
 
     embed = discord.Embed(title="Training Regimen",
                           description="Choose a skill to train. Each session improves a skill by 1 level.",
@@ -1104,18 +1571,15 @@ async def train(ctx):
                     inline=False)
     embed.add_field(name="❤️ Endurance", value="Reduces cooldowns for `>patrol` and `>scavenge`.", inline=False)
 
-    view = TrainView(ctx.author)
-    await ctx.reply(embed=embed, view=view)
+    await ctx.reply(embed=embed, view=train_view(ctx.author.id))
 
 
 @bot.command()
 @commands.is_owner()
 async def sethonor(ctx, member: discord.Member, amount: int):
     if not game_features_enabled: return
-    member_id = str(member.id);
-    user_honor[member_id] = amount;
-    save_data(user_honor, HONOR_FILE)
-    await check_and_update_roles(member)
+    set_honor(member.id, amount)
+    queue_role_update(member)
     await ctx.reply(f"Set {member.mention}'s Honor to {amount}.")
 
 
@@ -1123,11 +1587,9 @@ async def sethonor(ctx, member: discord.Member, amount: int):
 @commands.is_owner()
 async def addhonor(ctx, member: discord.Member, amount: int):
     if not game_features_enabled: return
-    member_id = str(member.id);
-    user_honor[member_id] = user_honor.get(member_id, 0) + amount;
-    save_data(user_honor, HONOR_FILE)
-    await check_and_update_roles(member)
-    await ctx.reply(f"Added {amount} Honor to {member.mention}. They now have {user_honor[member_id]} Honor.")
+    new_total = add_honor(member.id, amount)
+    queue_role_update(member)
+    await ctx.reply(f"Added {amount} Honor to {member.mention}. They now have {new_total} Honor.")
 
 
 @bot.command()
@@ -1137,44 +1599,37 @@ async def ranklist(ctx):
 
     await ctx.defer()
 
-    embed = discord.Embed(title="Server Rank Roster", color=discord.Color.from_rgb(200, 160, 100))
+    pages = roster_pages(ctx.guild)
+    if not pages:
+        embed = discord.Embed(title="Server Rank Roster", description="No members currently hold any ranks.",
+                              color=discord.Color.from_rgb(200, 160, 100))
+        return await ctx.send(embed=embed)
 
-    description_lines = []
-
-    for rank_data in reversed(RANK_ROLES):
-        role_name = rank_data["name"]
-        role_obj = discord.utils.get(ctx.guild.roles, name=role_name)
-
-        if role_obj and role_obj.members:
-            members_with_role = sorted(role_obj.members, key=lambda m: m.display_name)
-            member_mentions = [member.mention for member in members_with_role]
-
-            line = f"**{role_name}**: {', '.join(member_mentions)}"
-            description_lines.append(line)
-
-    if not description_lines:
-        embed.description = "No members currently hold any ranks."
-    else:
-        embed.description = "\n".join(description_lines)
-
-    await ctx.send(embed=embed)
+    await ctx.send(embed=roster_embed(pages, 0), view=roster_view(ctx.author.id, pages, 0) if len(pages) > 1 else None)
 
 
 @bot.command()
 @commands.is_owner()
 async def update(ctx):
     """(Owner only) Pulls the latest code from GitHub and restarts the bot."""
+    await store.flush()
     await ctx.send("`Pulling latest code from GitHub...`")
 
     try:
-        result = subprocess.run(["git", "pull"], capture_output=True, text=True, check=True)
-        await ctx.send(f"```\n{result.stdout}\n```")
+        # Run as async subprocesses so a slow pull doesn't stall the gateway heartbeat.
+        pull = await asyncio.create_subprocess_exec("git", "pull", stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await pull.communicate()
+        if pull.returncode:
+            return await ctx.send(f"**An error occurred during `git pull`:**\n```\n{stderr.decode()}\n```")
+        await ctx.send(f"```\n{stdout.decode()}\n```")
 
         await ctx.send("`Restarting bot service...`")
-        subprocess.run(["sudo", "systemctl", "restart", "discord-bot.service"])
+        # Changes made while the pull ran aren't flushed yet.
+        await store.flush()
+        restart = await asyncio.create_subprocess_exec("sudo", "systemctl", "restart", "discord-bot.service")
+        await restart.wait()
 
-    except subprocess.CalledProcessError as e:
-        await ctx.send(f"**An error occurred during `git pull`:**\n```\n{e.stderr}\n```")
     except Exception as e:
         await ctx.send(f"**An unexpected error occurred:**\n```\n{e}\n```")
 
@@ -1191,15 +1646,15 @@ async def pvp(ctx, target: discord.Member, wager: int):
     if wager < 0:
         return await ctx.reply("You cannot wager a negative amount of Honor.")
 
-    challenger_honor = user_honor.get(str(challenger.id), 0)
-    target_honor = user_honor.get(str(target.id), 0)
+    challenger_honor = get_honor(challenger.id)
+    target_honor = get_honor(target.id)
 
     if challenger_honor < wager:
         return await ctx.reply(f"You do not have enough Honor to wager {wager}.")
     if target_honor < wager:
         return await ctx.reply(f"{target.mention} does not have enough Honor to accept this wager.")
 
-    pvp_invitations[target.id] = {
+    game_states.get(ctx.guild.id).pvp_invitations[target.id] = {
         "challenger": challenger.id,
         "wager": wager,
         "time": datetime.datetime.now()
@@ -1212,6 +1667,7 @@ async def pvp(ctx, target: discord.Member, wager: int):
 async def pvpaccept(ctx):
     """Accept a pending duel invitation."""
     if not game_features_enabled: return
+    pvp_invitations = game_states.get(ctx.guild.id).pvp_invitations
     challenger_id = pvp_invitations.get(ctx.author.id, {}).get("challenger")
 
     if not challenger_id:
@@ -1238,15 +1694,12 @@ async def killstreak(ctx):
     """Displays the top 10 PvP killstreaks."""
     if not game_features_enabled: return
 
-    sorted_streaks = sorted(user_stats.items(), key=lambda item: item[1].get('kill_streak', 0), reverse=True)
-
     embed = discord.Embed(title="🔥 Killstreak Leaderboard 🔥", color=discord.Color.red())
     description = ""
 
-    for i, (user_id, stats) in enumerate(sorted_streaks[:10]):
+    for i, (user_id, streak) in enumerate(streak_board.page(0, 10)):
         member = ctx.guild.get_member(int(user_id))
         if member:
-            streak = stats.get('kill_streak', 0)
             description += f"**{i + 1}.** {member.mention}: {streak} wins\n"
 
     if not description:
@@ -1256,14 +1709,35 @@ async def killstreak(ctx):
     await ctx.send(embed=embed)
 
 
+@bot.command()
+async def top(ctx, page: int = 1):
+    """Displays a page of the Honor leaderboard."""
+    if not game_features_enabled: return
+    total_pages = max(1, -(-len(honor_board) // LEADERBOARD_PAGE_SIZE))
+    page = min(max(1, page), total_pages)
+    start = (page - 1) * LEADERBOARD_PAGE_SIZE
+
+    embed = discord.Embed(title="🎖️ Honor Leaderboard 🎖️", color=discord.Color.gold())
+    lines = [f"**{start + i + 1}.** <@{user_id}>: {score} Honor" for i, (user_id, score) in
+             enumerate(honor_board.page(start, LEADERBOARD_PAGE_SIZE))]
+    embed.description = "\n".join(lines) or "No one has earned any Honor yet."
+
+    position = honor_board.position(str(ctx.author.id))
+    standing = f"Your position: #{position} of {len(honor_board)}" if position else "You are not ranked yet."
+    embed.set_footer(text=f"Page {page}/{total_pages} • {standing}")
+    await ctx.send(embed=embed)
+
+
 # This check will be added to the top of all game commands
 @bot.check
 async def check_if_prisoner(ctx):
     if ctx.author.id == OWNER_ID:
         return True  # Owner bypasses all checks
+    if ctx.guild is None:
+        return True
 
-    prisoner_role = discord.utils.get(ctx.guild.roles, name=PRISONER_ROLE_NAME)
-    if prisoner_role and prisoner_role in ctx.author.roles:
+    prisoner_role = guild_index.role(ctx.guild, PRISONER_ROLE_NAME)
+    if prisoner_role and ctx.author.get_role(prisoner_role.id):
         # Define commands that prisoners CAN use
         allowed_commands = ['help', 'ping']
         if ctx.command.name not in allowed_commands:
@@ -1274,6 +1748,11 @@ async def check_if_prisoner(ctx):
 
 @bot.event
 async def on_command_error(ctx, error):
+    command_name = ctx.command.qualified_name if ctx.command else "unknown"
+    if isinstance(error, COMMAND_REJECTIONS):
+        command_rejections.inc(command_name)
+    else:
+        command_latency.error(command_name, type(getattr(error, "original", error)).__name__)
     if isinstance(error, commands.CommandOnCooldown):
         if ctx.command.name == 'hit':
             try:
@@ -1291,10 +1770,13 @@ async def on_command_error(ctx, error):
         await ctx.reply(f"I could not find the channel you specified.")
     elif isinstance(error, commands.MissingRequiredArgument):
         await ctx.reply(f"You're missing a required argument for this command.")
+    elif isinstance(error, commands.BadArgument):
+        await ctx.reply(f"Invalid argument. Usage: `>{ctx.command.qualified_name} {ctx.command.signature}`")
     elif isinstance(error, commands.CommandNotFound):
         await ctx.reply("Unrecognized command. Use `>help` to see a list of available commands.")
     else:
         print(f"An unhandled error occurred: {error}")
 
 
-bot.run(TOKEN)
\ No newline at end of file
+if __name__ == "__main__":
+    bot.run(TOKEN)
\ No newline at end of file
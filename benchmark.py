@@ -0,0 +1,156 @@
+"""Microbenchmarks for the game engine: per-operation throughput and allocation at several player counts.
+
+Runs every GameEngine operation against a seeded synthetic population, so results are comparable between
+runs. Save a baseline before a change and compare against it afterwards; operations that got slower or
+allocate more than the tolerance allows are flagged and the exit status is 1.
+
+    python benchmark.py --save bench.json
+    python benchmark.py --compare bench.json
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from combat import CombatProfile
+from engine import GameEngine, max_craftable
+from game_data import RANK_ROLES, RECIPES
+from players import Player, MATERIAL_NAMES, SKILL_NAMES
+
+
+def make_population(count, seed):
+    """count Players with random honor, skills and materials, and a CombatProfile for each."""
+    rng = random.Random(seed)
+    engine = GameEngine()
+    players, profiles = [], []
+    for user_id in range(count):
+        player = Player(user_id)
+        player.honor = int(rng.paretovariate(1.2) * 100)
+        for name in SKILL_NAMES:
+            setattr(player, name, rng.randint(1, 100))
+        for i in range(len(MATERIAL_NAMES)):
+            player.materials[i] = rng.randint(0, 200)
+        rank = engine.rank_for_honor(player.honor) or RANK_ROLES[0]
+        profile = CombatProfile()
+        profile.guild_id = 0
+        profile.rank_weight = rank["weight"]
+        profile.weapon_bonus = rng.choice((0, 0, 5, 10, 15))
+        profile.has_armor = rng.random() < 0.3
+        profile.gear = frozenset()
+        for name in SKILL_NAMES:
+            setattr(profile, name, getattr(player, name))
+        players.append(player)
+        profiles.append(profile)
+    return players, profiles
+
+
+def operations(engine, players, profiles):
+    """(name, callable) pairs; each call does one operation on a different player where that applies."""
+    recipes = list(RECIPES.values())
+    pick = itertools.cycle([(players[i % len(players)], profiles[i % len(profiles)], recipes[i % len(recipes)])
+                            for i in range(4096)]).__next__
+
+    return [
+        ("rank_for_honor", lambda: engine.rank_for_honor(pick()[0].honor)),
+        ("hit_damage", lambda: engine.hit_damage(pick()[1])),
+        ("patrol", engine.patrol),
+        ("patrol_fight", lambda: engine.patrol_fight(pick()[1])),
+        ("scavenge", lambda: engine.scavenge(1, pick()[0].intelligence)),
+        ("scavenge_x10", lambda: engine.scavenge(10, pick()[0].intelligence)),
+        ("craft_check", lambda: engine.craft_check(*pick()[::2])),
+        ("max_craftable", lambda: max_craftable(*pick()[::2])),
+        ("resolve_attack", lambda: engine.resolve_attack(profiles)),
+    ]
+
+
+def measure(func, min_time, repeat=5):
+    """Returns (ops per second, bytes allocated per op) for func.
+
+    Throughput is the best of repeat rounds of at least min_time / repeat seconds each, which filters out
+    scheduler noise. Allocation is the mean peak of memory allocated while a single call runs.
+    """
+    round_time = min_time / repeat
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= round_time:
+            break
+        calls *= 2 if elapsed < round_time / 10 else 1 + int(round_time / max(elapsed, 1e-9))
+    best = elapsed
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, time.perf_counter() - started)
+
+    samples = min(calls, 200)
+    allocated = 0
+    tracemalloc.start()
+    for _ in range(samples):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return calls / best, allocated / samples
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing every result that's slower or allocates more than baseline by more than tolerance."""
+    regressions = []
+    for key, (rate, allocated) in results.items():
+        if key not in baseline:
+            continue
+        base_rate, base_allocated = baseline[key]
+        if rate < base_rate * (1 - tolerance):
+            regressions.append(f"{key}: {rate:,.0f} ops/s, was {base_rate:,.0f} ({rate / base_rate - 1:+.0%})")
+        if allocated > base_allocated * (1 + tolerance) + 64:
+            regressions.append(f"{key}: {allocated:,.0f} B/op, was {base_allocated:,.0f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[10, 100, 1000, 10000],
+                        help="Population sizes; resolve_attack uses the whole population as its defenders.")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds to time each operation for.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="Only run these operations.")
+    parser.add_argument("--save", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Flag regressions against results saved with --save.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown/allocation growth.")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'operation':<16}{'players':>8}{'ops/s':>14}{'ns/op':>12}{'B/op':>10}")
+    for count in args.players:
+        players, profiles = make_population(count, args.seed)
+        engine = GameEngine(args.seed)
+        for name, func in operations(engine, players, profiles):
+            if args.only and name not in args.only:
+                continue
+            rate, allocated = measure(func, args.min_time)
+            results[f"{name}@{count}"] = (rate, allocated)
+            print(f"{name:<16}{count:>8}{rate:>14,.0f}{1e9 / rate:>12,.0f}{allocated:>10,.0f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
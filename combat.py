@@ -0,0 +1,53 @@
+from game_data import RECIPES
+from players import ITEM_INDEX
+
+
+class CombatProfile:
+    """Everything the combat formulas read about one member, precomputed."""
+
+    __slots__ = ("guild_id", "rank_weight", "weapon_bonus", "has_armor", "gear", "strength", "agility",
+                 "intelligence", "endurance")
+
+    @property
+    def power(self):
+        return self.rank_weight + self.weapon_bonus
+
+
+class CombatProfileCache:
+    """Per-user CombatProfile cache. Callers invalidate a user whenever their items, skills or roles change."""
+
+    def __init__(self, rank_index, get_player):
+        self.rank_index = rank_index
+        self._get_player = get_player
+        self._weapons = sorted(((recipe.get("weight_bonus", 0), ITEM_INDEX[name]) for name, recipe in RECIPES.items()
+                                if recipe.get("type") == "weapon"), reverse=True)
+        self._armor = [ITEM_INDEX[name] for name, recipe in RECIPES.items() if recipe.get("type") == "armor"]
+        self._gear = [(ITEM_INDEX[name], name) for name, recipe in RECIPES.items() if recipe.get("type") == "gear"]
+        self._profiles = {}
+
+    def get(self, member):
+        profile = self._profiles.get(member.id)
+        if profile is None or profile.guild_id != member.guild.id:
+            profile = self._profiles[member.id] = self._build(member)
+        return profile
+
+    def _build(self, member):
+        player = self._get_player(member.id)
+        items = player.items
+        profile = CombatProfile()
+        profile.guild_id = member.guild.id
+        profile.rank_weight = self.rank_index.member_weight(member)
+        profile.weapon_bonus = next((bonus for bonus, index in self._weapons if items[index] > 0), 0)
+        profile.has_armor = any(items[index] > 0 for index in self._armor)
+        profile.gear = frozenset(name for index, name in self._gear if items[index] > 0)
+        profile.strength = player.strength
+        profile.agility = player.agility
+        profile.intelligence = player.intelligence
+        profile.endurance = player.endurance
+        return profile
+
+    def invalidate(self, user_id):
+        self._profiles.pop(int(user_id), None)
+
+    def clear(self):
+        self._profiles.clear()
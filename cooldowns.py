@@ -0,0 +1,114 @@
+import time
+
+
+class Cooldown:
+    """Per-user cooldown measured on the monotonic clock.
+
+    Only expiry times are stored, so an entry is dead as soon as it expires; sweep() drops those and keeps
+    memory proportional to the users who are currently cooling down.
+    """
+
+    def __init__(self, duration, clock=time.monotonic):
+        self.duration = duration
+        self._clock = clock
+        self._expiry = {}
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def remaining(self, user_id):
+        expiry = self._expiry.get(user_id)
+        if expiry is None:
+            return 0.0
+        remaining = expiry - self._clock()
+        if remaining <= 0:
+            del self._expiry[user_id]
+            return 0.0
+        return remaining
+
+    def try_acquire(self, user_id, duration=None):
+        """Starts the cooldown and returns 0 if the user is free, otherwise returns the seconds left."""
+        remaining = self.remaining(user_id)
+        if remaining:
+            return remaining
+        self._expiry[user_id] = self._clock() + (self.duration if duration is None else duration)
+        return 0.0
+
+    def reset(self, user_id):
+        self._expiry.pop(user_id, None)
+
+    def sweep(self):
+        now = self._clock()
+        expired = [user_id for user_id, expiry in self._expiry.items() if expiry <= now]
+        for user_id in expired:
+            del self._expiry[user_id]
+        return len(expired)
+
+
+class ChargedCooldown:
+    """Per-user cooldown that banks up to max_charges uses, regaining one charge every duration seconds.
+
+    Each user is tracked by the time their bank started refilling, so an entry is dead once the bank is full
+    again and sweep() can drop it like an expired Cooldown.
+    """
+
+    def __init__(self, duration, max_charges, clock=time.monotonic):
+        self.duration = duration
+        self.max_charges = max_charges
+        self._clock = clock
+        self._start = {}
+
+    def __len__(self):
+        return len(self._start)
+
+    def _bank(self, user_id, duration):
+        now = self._clock()
+        start = max(self._start.get(user_id, now - self.max_charges * duration), now - self.max_charges * duration)
+        return now, start, int((now - start) // duration)
+
+    def charges(self, user_id, duration=None):
+        return self._bank(user_id, self.duration if duration is None else duration)[2]
+
+    def take(self, user_id, count=1, duration=None):
+        """Spends up to count charges. Returns (charges spent, seconds until the next charge)."""
+        duration = self.duration if duration is None else duration
+        now, start, available = self._bank(user_id, duration)
+        spent = min(count, available)
+        start += spent * duration
+        self._start[user_id] = start
+        return spent, duration - (now - start) % duration
+
+    def reset(self, user_id):
+        self._start.pop(user_id, None)
+
+    def sweep(self):
+        now = self._clock()
+        full = [user_id for user_id, start in self._start.items() if now - start >= self.max_charges * self.duration]
+        for user_id in full:
+            del self._start[user_id]
+        return len(full)
+
+
+class CooldownManager:
+    """Named Cooldowns that are swept together."""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._cooldowns = {}
+
+    def register(self, name, duration, max_charges=None):
+        if max_charges is None:
+            cooldown = Cooldown(duration, clock=self._clock)
+        else:
+            cooldown = ChargedCooldown(duration, max_charges, clock=self._clock)
+        self._cooldowns[name] = cooldown
+        return cooldown
+
+    def __getitem__(self, name):
+        return self._cooldowns[name]
+
+    def sweep(self):
+        return sum(cooldown.sweep() for cooldown in self._cooldowns.values())
+
+    def sizes(self):
+        return {name: len(cooldown) for name, cooldown in self._cooldowns.items()}
@@ -0,0 +1,114 @@
+import random
+from collections import Counter
+from itertools import accumulate
+
+from game_data import RANK_ROLES, ACQUIRABLE_RANK_ROLES, MATERIALS, MATERIAL_RARITY_WEIGHTS
+from players import MATERIAL_NAMES
+from ranks import RankIndex
+
+ATTACK_LOW_FACTOR = 0.7
+ATTACK_BONUS = 5
+ATTACK_HONOR = (50, 100)
+ATTACK_CHANCE_PER_CHECK = 1 / 120
+PATROL_ENCOUNTER_CHANCE = 0.5
+PATROL_UNEVENTFUL_HONOR = (5, 10)
+PATROL_VICTORY_HONOR = (75, 150)
+BOSS_DAMAGE = (5, 15)
+BOSS_HONOR = (250, 500)
+SALUTE_HONOR = (5, 15)
+SCAVENGE_BASE_ITEMS = (2, 4)
+MAX_SKILL_LEVEL = 100
+MATERIAL_CUM_WEIGHTS = list(accumulate(MATERIAL_RARITY_WEIGHTS[m["rarity"]] for m in MATERIALS))
+
+
+def difficulty_mod(num_defenders):
+    return max(0.8, 1.5 - (num_defenders * 0.05))
+
+
+def patrol_win_chance(rank_weight):
+    return min(0.30 + (rank_weight * 0.05), 0.95)
+
+
+def endurance_cooldown(endurance):
+    """Patrol/scavenge cooldown in seconds: 60s, minus half a second per Endurance level, never below 10s."""
+    return max(10, 60 - (endurance * 0.5))
+
+
+def max_craftable(player, recipe):
+    return min(player.material(mat) // required for mat, required in recipe["materials"].items())
+
+
+def missing_materials(player, recipe, quantity=1):
+    """How many more of each material player needs to craft quantity of recipe; empty if they have enough."""
+    return {mat: required * quantity - player.material(mat) for mat, required in recipe["materials"].items()
+            if player.material(mat) < required * quantity}
+
+
+class GameEngine:
+    """The game rules, free of Discord objects, so they can be benchmarked and replayed offline.
+
+    Every roll goes through self.random, so two engines built with the same seed produce the same outcomes
+    for the same calls. Combat methods take CombatProfiles (or anything with the same attributes) and plain
+    numbers; applying the results to players and rendering them is left to the caller.
+    """
+
+    def __init__(self, seed=None, rank_index=None):
+        self.random = random.Random(seed)
+        self.ranks = rank_index or RankIndex(RANK_ROLES, len(ACQUIRABLE_RANK_ROLES))
+
+    def seed(self, seed):
+        self.random.seed(seed)
+
+    def attack_due(self):
+        """One scheduler check for a surprise attack."""
+        return self.random.random() < ATTACK_CHANCE_PER_CHECK
+
+    def resolve_attack(self, profiles, num_defenders=None):
+        """Returns (defense strength, attack strength, honor per defender); honor is 0 if the defense failed.
+
+        num_defenders defaults to len(profiles); pass it when some defenders no longer have a profile.
+        """
+        defense = sum(profile.rank_weight + profile.agility for profile in profiles)
+        num_defenders = len(profiles) if num_defenders is None else num_defenders
+        attack = self.random.randint(int(defense * ATTACK_LOW_FACTOR), int(defense * difficulty_mod(num_defenders)))
+        attack += ATTACK_BONUS
+        honor = self.random.randint(*ATTACK_HONOR) if defense >= attack else 0
+        return defense, attack, honor
+
+    def hit_damage(self, profile):
+        return self.random.randint(*BOSS_DAMAGE) + profile.power + profile.strength
+
+    def boss_reward(self):
+        return self.random.randint(*BOSS_HONOR)
+
+    def patrol(self):
+        """Honor for an uneventful patrol, or None if the player ran into an encounter."""
+        if self.random.random() > PATROL_ENCOUNTER_CHANCE:
+            return self.random.randint(*PATROL_UNEVENTFUL_HONOR)
+        return None
+
+    def patrol_fight(self, profile):
+        """Honor for fighting a patrol encounter; 0 on a defeat."""
+        if self.random.random() < patrol_win_chance(profile.rank_weight):
+            return self.random.randint(*PATROL_VICTORY_HONOR)
+        return 0
+
+    def salute_honor(self):
+        return self.random.randint(*SALUTE_HONOR)
+
+    def scavenge(self, runs, intelligence):
+        """Materials found over runs scavenging runs, in MATERIAL_NAMES order and without zero entries."""
+        count = sum(self.random.randint(*SCAVENGE_BASE_ITEMS) for _ in range(runs)) + runs * (intelligence // 10)
+        found = Counter(self.random.choices(MATERIAL_NAMES, cum_weights=MATERIAL_CUM_WEIGHTS, k=count))
+        return {name: found[name] for name in MATERIAL_NAMES if name in found}
+
+    def craft_check(self, player, recipe, quantity=1):
+        """Returns (meets the Intelligence requirement, missing materials) for crafting quantity of recipe."""
+        return player.intelligence >= recipe["intelligence_req"], missing_materials(player, recipe, quantity)
+
+    def rank_for_honor(self, honor):
+        return self.ranks.rank_for_honor(honor)
+
+    def train(self, level):
+        """The level after one training session, or None if the skill is already maxed."""
+        return level + 1 if level < MAX_SKILL_LEVEL else None
@@ -0,0 +1,101 @@
+RANK_ROLES = [
+    {"name": "Private", "honor": 0, "weight": 1, "base_health": 100},
+    {"name": "Private First Class", "honor": 150, "weight": 2, "base_health": 120},
+    {"name": "Corporal", "honor": 600, "weight": 3, "base_health": 140},
+    {"name": "Sergeant", "honor": 1350, "weight": 4, "base_health": 160},
+    {"name": "Staff Sergeant", "honor": 2400, "weight": 5, "base_health": 180},
+    {"name": "Master Sergeant", "honor": 3750, "weight": 6, "base_health": 200},
+    {"name": "Sergeant Major", "honor": 5400, "weight": 7, "base_health": 220},
+    {"name": "Lieutenant", "honor": 7350, "weight": 8, "base_health": 250},
+    {"name": "Captain", "honor": 9600, "weight": 9, "base_health": 280},
+    {"name": "Major", "honor": 12150, "weight": 10, "base_health": 320},
+    {"name": "Colonel", "honor": 15000, "weight": 11, "base_health": 360},
+    {"name": "Brigadier General", "honor": 18150, "weight": 12, "base_health": 400},
+    {"name": "General", "honor": 21600, "weight": 13, "base_health": 450},
+    {"name": "General of the Army", "honor": 25350, "weight": 15, "base_health": 500}
+]
+ACQUIRABLE_RANK_ROLES = RANK_ROLES[:11]
+RANK_ROLE_NAMES = {role["name"] for role in RANK_ROLES}
+ACQUIRABLE_RANK_ROLE_NAMES = {role["name"] for role in ACQUIRABLE_RANK_ROLES}
+UNACQUIRABLE_RANK_ROLE_NAMES = RANK_ROLE_NAMES - ACQUIRABLE_RANK_ROLE_NAMES
+
+MATERIALS = [
+    {"name": "Scrap Metal", "rarity": "common", "emoji": "🔩"},
+    {"name": "Gunpowder", "rarity": "common", "emoji": "🧨"},
+    {"name": "Duct Tape", "rarity": "common", "emoji": "🩹"},
+    {"name": "Electronics", "rarity": "uncommon", "emoji": "⚙️"},
+    {"name": "High-Grade Steel", "rarity": "uncommon", "emoji": "🛡️"},
+    {"name": "Medical Supplies", "rarity": "uncommon", "emoji": "⚕️"},
+    {"name": "Advanced Optics", "rarity": "rare", "emoji": "🔭"},
+    {"name": "Military-Grade Composite", "rarity": "rare", "emoji": "🪖"},
+    {"name": "Nuclear Material", "rarity": "legendary", "emoji": "☢️"}
+]
+MATERIAL_RARITY_WEIGHTS = {
+    "common": 60,
+    "uncommon": 30,
+    "rare": 9,
+    "legendary": 1
+}
+
+RECIPES = {
+    "Pipe Bomb": {
+        "description": "A simple, yet effective, explosive device.",
+        "materials": {"Scrap Metal": 5, "Gunpowder": 3, "Duct Tape": 1}, "emoji": "💣", "type": "consumable",
+        "intelligence_req": 5, "pvp_effect": {"damage": (40, 60)}
+    },
+    "Medkit": {
+        "description": "Restores health in the field.",
+        "materials": {"Medical Supplies": 5, "Duct Tape": 2}, "emoji": "➕", "type": "consumable",
+        "intelligence_req": 10, "pvp_effect": {"heal": (50, 80)}
+    },
+    "Pistol": {
+        "description": "Standard issue sidearm. Adds +2 power.",
+        "materials": {"Scrap Metal": 10, "High-Grade Steel": 2}, "emoji": "1️⃣", "type": "weapon", "weight_bonus": 2,
+        "intelligence_req": 15
+    },
+    "Shotgun": {
+        "description": "Devastating at close range. Adds +4 power.",
+        "materials": {"Scrap Metal": 15, "High-Grade Steel": 5, "Gunpowder": 5}, "emoji": "2️⃣", "type": "weapon",
+        "weight_bonus": 4, "intelligence_req": 20
+    },
+    "Assault Rifle": {
+        "description": "A versatile automatic weapon. Adds +6 power.",
+        "materials": {"High-Grade Steel": 10, "Electronics": 5, "Scrap Metal": 20}, "emoji": "3️⃣", "type": "weapon",
+        "weight_bonus": 6, "intelligence_req": 30
+    },
+    "Sniper Rifle": {
+        "description": "For taking out targets from a distance. Adds +8 power.",
+        "materials": {"High-Grade Steel": 15, "Advanced Optics": 2, "Electronics": 3}, "emoji": "4️⃣", "type": "weapon",
+        "weight_bonus": 8, "intelligence_req": 40
+    },
+    "Rocket Launcher": {
+        "description": "Delivers a high-explosive payload. Adds +12 power.",
+        "materials": {"High-Grade Steel": 25, "Electronics": 10, "Gunpowder": 20, "Military-Grade Composite": 5},
+        "emoji": "🚀", "type": "weapon", "weight_bonus": 12, "intelligence_req": 50
+    },
+    "Body Armor": {
+        "description": "Reduces incoming damage. (Passive)",
+        "materials": {"High-Grade Steel": 20, "Military-Grade Composite": 10}, "emoji": "🦺", "type": "armor",
+        "intelligence_req": 25
+    },
+    "Nightvision Goggles": {
+        "description": "Grants the ability to see in the dark. (Passive)",
+        "materials": {"Electronics": 15, "Advanced Optics": 5, "Duct Tape": 5}, "emoji": "🥽", "type": "gear",
+        "intelligence_req": 35
+    },
+    "Suppressor": {
+        "description": "Reduces weapon noise. (Passive)",
+        "materials": {"Scrap Metal": 15, "Electronics": 1}, "emoji": "🤫", "type": "gear", "intelligence_req": 15
+    },
+    "Tactical Nuke": {
+        "description": "The ultimate weapon. Use with extreme caution.",
+        "materials": {"Nuclear Material": 3, "Military-Grade Composite": 20, "Electronics": 30, "High-Grade Steel": 50},
+        "emoji": "☢️", "type": "consumable", "intelligence_req": 90, "pvp_effect": {"damage": 9999}
+    },
+    "Coast Guard Battleship": {
+        "description": "A formidable naval vessel.",
+        "materials": {"Nuclear Material": 10, "High-Grade Steel": 200, "Military-Grade Composite": 100,
+                      "Electronics": 150, "Advanced Optics": 50}, "emoji": "🚢", "type": "vehicle",
+        "intelligence_req": 100
+    }
+}
@@ -0,0 +1,39 @@
+class GameState:
+    """Event state for a single guild: raids, world bosses, salute windows and duel invitations."""
+
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.attack_channel_id = None
+        self.attack_in_progress = False
+        self.defenders = set()
+        self.davis_salute_event_active = False
+        self.davis_saluters = set()
+        self.boss_event_active = False
+        self.boss_hp = 0
+        self.boss_max_hp = 0
+        self.boss_title = ""
+        self.boss_event_message = None
+        self.boss_damage_ledger = {}
+        self.boss_pending_damage = 0
+        self.boss_rendered_bucket = None
+        self.pvp_invitations = {}
+        self.active_pvp_matches = {}
+
+
+class GameStateRegistry:
+    """Lazily creates one GameState per guild so events in different guilds never share state."""
+
+    def __init__(self):
+        self._states = {}
+
+    def get(self, guild_id):
+        state = self._states.get(guild_id)
+        if state is None:
+            state = self._states[guild_id] = GameState(guild_id)
+        return state
+
+    def discard(self, guild_id):
+        self._states.pop(guild_id, None)
+
+    def __iter__(self):
+        return iter(list(self._states.values()))
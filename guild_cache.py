@@ -0,0 +1,44 @@
+class GuildIndex:
+    """Name-keyed role and channel lookups per guild.
+
+    Each guild's maps are built on first use and dropped whenever a role or channel in that guild is
+    created, updated or deleted, so a lookup is a dict access instead of a scan over guild.roles.
+    """
+
+    def __init__(self):
+        self._roles = {}
+        self._channels = {}
+
+    @staticmethod
+    def _by_name(items):
+        index = {}
+        for item in items:
+            # discord.utils.get returns the first match, so keep the first object for duplicate names.
+            index.setdefault(item.name, item)
+        return index
+
+    def build(self, guild):
+        self._roles[guild.id] = self._by_name(guild.roles)
+        self._channels[guild.id] = self._by_name(guild.channels)
+
+    def role(self, guild, name):
+        roles = self._roles.get(guild.id)
+        if roles is None:
+            roles = self._roles[guild.id] = self._by_name(guild.roles)
+        return roles.get(name)
+
+    def channel(self, guild, name):
+        channels = self._channels.get(guild.id)
+        if channels is None:
+            channels = self._channels[guild.id] = self._by_name(guild.channels)
+        return channels.get(name)
+
+    def invalidate_roles(self, guild):
+        self._roles.pop(guild.id, None)
+
+    def invalidate_channels(self, guild):
+        self._channels.pop(guild.id, None)
+
+    def forget(self, guild):
+        self.invalidate_roles(guild)
+        self.invalidate_channels(guild)
@@ -0,0 +1,57 @@
+import bisect
+
+
+class Leaderboard:
+    """A descending leaderboard kept sorted as scores change.
+
+    Entries are stored as (-score, user_id) so bisect gives both the insertion point for an update and a
+    user's position in O(log n). Users with a score of zero or less are left off the board.
+    """
+
+    def __init__(self, scores=None):
+        self._scores = {user_id: score for user_id, score in (scores or {}).items() if score > 0}
+        self._entries = sorted((-score, user_id) for user_id, score in self._scores.items())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def score(self, user_id):
+        return self._scores.get(user_id, 0)
+
+    def update(self, user_id, score):
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            del self._entries[bisect.bisect_left(self._entries, (-old, user_id))]
+            del self._scores[user_id]
+        if score > 0:
+            self._scores[user_id] = score
+            bisect.insort(self._entries, (-score, user_id))
+
+    def update_many(self, scores):
+        """Applies many score changes at once; large batches re-sort the board instead of shifting it per user."""
+        if len(scores) < 32:
+            for user_id, score in scores.items():
+                self.update(user_id, score)
+            return
+        for user_id, score in scores.items():
+            if score > 0:
+                self._scores[user_id] = score
+            else:
+                self._scores.pop(user_id, None)
+        self._entries = sorted((-score, user_id) for user_id, score in self._scores.items())
+
+    def position(self, user_id):
+        """1-based position of user_id, or None if they aren't on the board."""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._entries, (-score, user_id)) + 1
+
+    def page(self, start, count):
+        return [(user_id, -negated) for negated, user_id in self._entries[start:start + count]]
+
+    def __iter__(self):
+        for negated, user_id in self._entries:
+            yield user_id, -negated
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+
+class Stall:
+    def __init__(self, lag, culprit, stack):
+        self.lag = lag
+        self.culprit = culprit
+        self.stack = stack
+        self.at = time.time()
+
+
+class LoopWatchdog:
+    """Measures asyncio scheduling lag and captures what the loop was running when it stalled.
+
+    A task wakes up every interval seconds and records how late it was. A daemon thread watches that
+    heartbeat; once it's more than threshold seconds stale, the thread grabs the loop thread's current stack,
+    which is the code blocking the loop. The stall is reported through on_stall from the loop itself as soon
+    as it recovers, with culprit naming the innermost frame from this project rather than a library.
+    """
+
+    def __init__(self, threshold=0.25, interval=0.1, on_lag=None, on_stall=None, root=None, history=20,
+                 stack_depth=12):
+        self.threshold = threshold
+        self.interval = interval
+        self.on_lag = on_lag
+        self.on_stall = on_stall
+        self.root = os.path.abspath(root or os.path.dirname(__file__))
+        self.stack_depth = stack_depth
+        self.recent = deque(maxlen=history)
+        self.max_lag = 0.0
+        self._beat = time.monotonic()
+        self._captured = None
+        self._loop_thread = None
+        self._task = None
+        self._thread = None
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            lag = max(0.0, now - expected)
+            self.max_lag = max(self.max_lag, lag)
+            if self.on_lag is not None:
+                self.on_lag(lag)
+            captured, self._captured = self._captured, None
+            if lag >= self.threshold and captured is not None:
+                stall = Stall(lag, self._culprit(captured), "".join(traceback.format_list(captured[-self.stack_depth:])))
+                self.recent.append(stall)
+                if self.on_stall is not None:
+                    self.on_stall(stall)
+
+    def _watch(self):
+        reported = None
+        while self._task is None or not self._task.done():
+            time.sleep(self.threshold / 2)
+            beat = self._beat
+            if beat == reported or time.monotonic() - beat < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._captured = traceback.extract_stack(frame)
+            reported = beat
+        self._thread = None
+
+    def _culprit(self, stack):
+        for entry in reversed(stack):
+            filename = os.path.abspath(entry.filename)
+            if (filename.startswith(self.root) and "site-packages" not in filename
+                    and filename != os.path.abspath(__file__)):
+                return f"{os.path.basename(filename)}:{entry.lineno} in {entry.name}"
+        entry = stack[-1]
+        return f"{os.path.basename(entry.filename)}:{entry.lineno} in {entry.name}"
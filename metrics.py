@@ -0,0 +1,229 @@
+import asyncio
+import bisect
+import contextvars
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+# Upper bounds in seconds, from a fast dict update up to a slow REST call or a stalled flush.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation; inf if it's past the last bucket."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class LatencyMetric:
+    """Latency histograms and error counts for one kind of operation, split by a single label.
+
+    Each label value (a command name, a storage operation, a REST call) gets its own histogram. Errors are
+    counted per label value and exception type, whether they're reported explicitly or escape time()/wrap().
+    """
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.series = {}
+        self.errors = {}
+        # The task (None outside of one) inside an instrument()ed method, or False when no call is in progress.
+        self._timing = contextvars.ContextVar(f"{name}_timing", default=False)
+
+    def observe(self, value, seconds):
+        histogram = self.series.get(value)
+        if histogram is None:
+            histogram = self.series[value] = Histogram()
+        histogram.observe(seconds)
+
+    def error(self, value, kind):
+        key = (value, kind)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def error_count(self, value):
+        return sum(count for (label, _), count in self.errors.items() if label == value)
+
+    @contextmanager
+    def time(self, value):
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.error(value, type(e).__name__)
+            raise
+        finally:
+            self.observe(value, time.perf_counter() - started)
+
+    def wrap(self, func, value):
+        """Returns func (sync or async) timed under value."""
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed(*args, **kwargs):
+                with self.time(value):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def timed(*args, **kwargs):
+                with self.time(value):
+                    return func(*args, **kwargs)
+        return timed
+
+    def timed(self, value):
+        """Decorator form of wrap()."""
+        return lambda func: self.wrap(func, value)
+
+    def instrument(self, obj, *methods):
+        """Replaces each named method on obj with a timed wrapper labelled by the method name.
+
+        When these methods call each other (e.g. record() going through mark_dirty()), only the outermost call
+        is timed, so nothing is counted twice.
+        """
+        for method in methods:
+            setattr(obj, method, self._outermost(getattr(obj, method), method))
+
+    def _outermost(self, func, value):
+        timed = self.wrap(func, value)
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def outermost(*args, **kwargs):
+                task = _current_task()
+                if self._timing.get() is task:
+                    return await func(*args, **kwargs)
+                token = self._timing.set(task)
+                try:
+                    return await timed(*args, **kwargs)
+                finally:
+                    self._timing.reset(token)
+        else:
+            @functools.wraps(func)
+            def outermost(*args, **kwargs):
+                task = _current_task()
+                if self._timing.get() is task:
+                    return func(*args, **kwargs)
+                token = self._timing.set(task)
+                try:
+                    return timed(*args, **kwargs)
+                finally:
+                    self._timing.reset(token)
+        return outermost
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for value, histogram in sorted(self.series.items()):
+            label = f'{self.label}="{_escape(value)}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f"{self.name}_sum{{{label}}} {histogram.sum:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {histogram.count}")
+        errors = self.name.removesuffix("_seconds") + "_errors_total"
+        lines.append(f"# TYPE {errors} counter")
+        for (value, kind), count in sorted(self.errors.items()):
+            lines.append(f'{errors}{{{self.label}="{_escape(value)}",error="{_escape(kind)}"}} {count}')
+        return lines
+
+
+class Counter:
+    """Counts split by a single label."""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.values = {}
+
+    def inc(self, value, amount=1):
+        self.values[value] = self.values.get(value, 0) + amount
+
+    def most_common(self, n):
+        return sorted(self.values.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for value, count in sorted(self.values.items()):
+            lines.append(f'{self.name}{{{self.label}="{_escape(value)}"}} {count}')
+        return lines
+
+
+class Metrics:
+    """Registry of latency metrics, counters and gauges, rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._series = {}
+        self._gauges = {}
+        self.started = time.monotonic()
+
+    def latency(self, name, help_text, label):
+        metric = self._series.get(name)
+        if metric is None:
+            metric = self._series[name] = LatencyMetric(name, help_text, label)
+        return metric
+
+    def counter(self, name, help_text, label):
+        metric = self._series.get(name)
+        if metric is None:
+            metric = self._series[name] = Counter(name, help_text, label)
+        return metric
+
+    def gauge(self, name, help_text, read):
+        """Registers a gauge whose value is read from read() whenever the metrics are rendered."""
+        self._gauges[name] = (help_text, read)
+
+    def exposition(self):
+        lines = []
+        for metric in self._series.values():
+            lines.extend(metric.exposition())
+        for name, (help_text, read) in self._gauges.items():
+            lines.extend((f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {read()}"))
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host, port):
+        """Serves exposition() at /metrics. Returns the aiohttp runner so the caller can clean it up."""
+        async def handle(request):
+            return web.Response(text=self.exposition(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def _current_task():
+    # Tasks inherit their creator's context, so a flush scheduled from inside a timed call still gets timed.
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
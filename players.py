@@ -0,0 +1,209 @@
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from game_data import MATERIALS, RECIPES
+
+SKILL_NAMES = ("strength", "agility", "intelligence", "endurance")
+STAT_NAMES = ("patrol_wins", "kill_streak")
+MATERIAL_NAMES = tuple(m["name"] for m in MATERIALS)
+ITEM_NAMES = tuple(RECIPES)
+MATERIAL_INDEX = {name: i for i, name in enumerate(MATERIAL_NAMES)}
+ITEM_INDEX = {name: i for i, name in enumerate(ITEM_NAMES)}
+
+# Which of the four data files a player has an entry in.
+HONOR, STATS, SKILLS, ARMORY = 1, 2, 4, 8
+
+
+class Player:
+    """Everything stored about one user, with materials and crafted items as fixed-index integer arrays.
+
+    Indices follow MATERIAL_NAMES and ITEM_NAMES. Names that aren't in game_data are dropped on load.
+    """
+
+    __slots__ = ("user_id", "sections", "honor", "strength", "agility", "intelligence", "endurance", "patrol_wins",
+                 "kill_streak", "materials", "items")
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.sections = 0
+        self.honor = 0
+        self.load_skills({})
+        self.load_stats({})
+        self.materials = array("q", bytes(8 * len(MATERIAL_NAMES)))
+        self.items = array("q", bytes(8 * len(ITEM_NAMES)))
+
+    def material(self, name):
+        return self.materials[MATERIAL_INDEX[name]]
+
+    def item(self, name):
+        return self.items[ITEM_INDEX[name]]
+
+    def skills_json(self):
+        return {name: getattr(self, name) for name in SKILL_NAMES}
+
+    def load_skills(self, row):
+        for name in SKILL_NAMES:
+            setattr(self, name, row.get(name, 1))
+
+    def stats_json(self):
+        return {name: getattr(self, name) for name in STAT_NAMES}
+
+    def load_stats(self, row):
+        for name in STAT_NAMES:
+            setattr(self, name, row.get(name, 0))
+
+    def armory_json(self):
+        return {"materials": {name: amount for name, amount in zip(MATERIAL_NAMES, self.materials) if amount},
+                "crafted_items": {name: amount for name, amount in zip(ITEM_NAMES, self.items) if amount}}
+
+    def load_armory(self, row):
+        for i in range(len(self.materials)):
+            self.materials[i] = 0
+        for i in range(len(self.items)):
+            self.items[i] = 0
+        for name, amount in row.get("materials", {}).items():
+            if name in MATERIAL_INDEX:
+                self.materials[MATERIAL_INDEX[name]] = amount
+        for name, amount in row.get("crafted_items", {}).items():
+            if name in ITEM_INDEX:
+                self.items[ITEM_INDEX[name]] = amount
+
+    def honor_json(self):
+        return self.honor
+
+    def load_honor(self, value):
+        self.honor = value or 0
+
+
+class PlayerTable:
+    """Players keyed by int user ID, plus one JSON-layout view per data file for the storage backends.
+
+    Without a loader every player stays resident. With one, players are loaded on first access and the least
+    recently used are dropped once more than max_resident are in memory; the loader's backend must already
+    hold every change (SqliteStore writes rows as they're recorded), since evicted players aren't written back.
+    Iterating the table or its views then only covers resident players. on_evict, if given, is called with each
+    evicted player so caches keyed by user can drop them too.
+    """
+
+    def __init__(self, loader=None, max_resident=None, on_evict=None):
+        self._players = OrderedDict()
+        self._loader = loader
+        self.max_resident = max_resident
+        self.on_evict = on_evict
+        self.loads = 0
+        self.evictions = 0
+        self.honor = SectionView(self, HONOR, Player.honor_json, Player.load_honor)
+        self.stats = SectionView(self, STATS, Player.stats_json, Player.load_stats)
+        self.skills = SectionView(self, SKILLS, Player.skills_json, Player.load_skills)
+        self.armory = SectionView(self, ARMORY, Player.armory_json, Player.load_armory)
+
+    @classmethod
+    def from_json(cls, honor, stats, skills, armory):
+        table = cls()
+        for view, data in ((table.honor, honor), (table.stats, stats), (table.skills, skills),
+                           (table.armory, armory)):
+            view.update(data)
+        return table
+
+    def __len__(self):
+        return len(self._players)
+
+    def __iter__(self):
+        return iter(list(self._players.values()))
+
+    def find(self, user_id):
+        user_id = int(user_id)
+        player = self._players.get(user_id)
+        if player is not None:
+            if self._loader is not None:
+                self._players.move_to_end(user_id)
+            return player
+        if self._loader is None:
+            return None
+        rows = self._loader(user_id)
+        if not rows:
+            return None
+        player = Player(user_id)
+        for view in (self.honor, self.stats, self.skills, self.armory):
+            if rows.get(view.section) is not None:
+                view.load(player, rows[view.section])
+                player.sections |= view.section
+        self.loads += 1
+        self._admit(player)
+        return player
+
+    def get(self, user_id):
+        player = self.find(user_id)
+        if player is None:
+            player = Player(int(user_id))
+            self._admit(player)
+        return player
+
+    def add(self, player):
+        """Inserts a fully built player, replacing any resident record with the same ID."""
+        self._admit(player)
+
+    def _admit(self, player):
+        self._players[player.user_id] = player
+        if self.max_resident is not None:
+            while len(self._players) > self.max_resident:
+                _, evicted = self._players.popitem(last=False)
+                self.evictions += 1
+                if self.on_evict is not None:
+                    self.on_evict(evicted)
+
+
+class SectionView(MutableMapping):
+    """One data file's worth of players in the original JSON layout: string user IDs to that file's rows.
+
+    Rows are built on access, so readers get a copy; writes go back through the Player's load method.
+    """
+
+    def __init__(self, table, section, dump, load):
+        self._table = table
+        self.section = section
+        self.dump = dump
+        self.load = load
+
+    def _find(self, user_id):
+        try:
+            player = self._table.find(user_id)
+        except ValueError:
+            return None
+        if player is None or not player.sections & self.section:
+            return None
+        return player
+
+    def __getitem__(self, user_id):
+        player = self._find(user_id)
+        if player is None:
+            raise KeyError(user_id)
+        return self.dump(player)
+
+    def __setitem__(self, user_id, row):
+        player = self._table.get(user_id)
+        self.load(player, row)
+        player.sections |= self.section
+
+    def __delitem__(self, user_id):
+        player = self._find(user_id)
+        if player is None:
+            raise KeyError(user_id)
+        self.load(player, {})
+        player.sections &= ~self.section
+
+    def __contains__(self, user_id):
+        return self._find(user_id) is not None
+
+    def __iter__(self):
+        return (str(player.user_id) for player in self._table if player.sections & self.section)
+
+    def __len__(self):
+        return sum(1 for player in self._table if player.sections & self.section)
+
+    def clear(self):
+        for player in self._table:
+            if player.sections & self.section:
+                self.load(player, {})
+                player.sections &= ~self.section
@@ -0,0 +1,57 @@
+import bisect
+
+
+class RankIndex:
+    """Precomputed lookups over the rank table, plus a per-member cache of each member's highest rank role."""
+
+    def __init__(self, rank_roles, acquirable_count):
+        self.ranks = list(rank_roles)
+        self.acquirable_count = acquirable_count
+        self.by_name = {rank["name"]: rank for rank in self.ranks}
+        self._positions = {rank["name"]: i for i, rank in enumerate(self.ranks)}
+        self._thresholds = [rank["honor"] for rank in self.ranks]
+        self._member_ranks = {}
+
+    def position(self, rank):
+        return self._positions[rank["name"]]
+
+    def rank_for_honor(self, honor):
+        index = bisect.bisect_right(self._thresholds, honor) - 1
+        return self.ranks[index] if index >= 0 else None
+
+    def acquirable_rank_for_honor(self, honor):
+        index = min(bisect.bisect_right(self._thresholds, honor), self.acquirable_count) - 1
+        return self.ranks[index] if index >= 0 else None
+
+    def next_rank(self, rank):
+        index = self._positions[rank["name"]] + 1 if rank else 0
+        return self.ranks[index] if index < len(self.ranks) else None
+
+    def is_acquirable(self, rank):
+        return self._positions[rank["name"]] < self.acquirable_count
+
+    def highest_rank(self, roles):
+        best = -1
+        for role in roles:
+            index = self._positions.get(role.name, -1)
+            if index > best:
+                best = index
+        return self.ranks[best] if best >= 0 else None
+
+    def member_rank(self, member):
+        key = (member.guild.id, member.id)
+        try:
+            return self._member_ranks[key]
+        except KeyError:
+            rank = self._member_ranks[key] = self.highest_rank(member.roles)
+            return rank
+
+    def member_weight(self, member):
+        rank = self.member_rank(member)
+        return rank["weight"] if rank else 1
+
+    def invalidate(self, member):
+        self._member_ranks.pop((member.guild.id, member.id), None)
+
+    def clear(self):
+        self._member_ranks.clear()
@@ -0,0 +1,34 @@
+from collections import OrderedDict
+
+
+class RenderCache:
+    """Small LRU cache for rendered embed content.
+
+    Keys should include the versions of whatever the content was rendered from, so stale entries are simply
+    never looked up again and age out of the cache instead of needing explicit invalidation.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, render):
+        """Returns the cached value for key, calling render() to produce it on a miss."""
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = self._entries[key] = render()
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,462 @@
+"""Load replay harness: drives the real bot object with recorded or synthetic traffic against a fake Discord.
+
+Gateway events are fed through discord.py's own parsers (MESSAGE_CREATE, INTERACTION_CREATE), so commands,
+checks, cooldowns and DynamicItem routing all run exactly as in production. The REST API and interaction
+webhooks are answered locally after --rest-latency seconds; rate limits are not simulated. The bot runs in a
+scratch copy of the data directory, so real player data is never touched.
+
+A trace is JSON lines, one event each: {"at": seconds, "user": member index, "content": ">hit"} for a
+message, or {"at": ..., "user": ..., "component": "davis:armory:{user}:page:"} to click the first component on
+that member's latest view whose custom_id starts with the prefix ({user} is replaced by their ID). Selects pick
+"values" if given, otherwise a random option. Member 0 is the bot owner.
+
+    python replay.py --scenario boss --users 300 --rate 150 --duration 20
+    python replay.py --scenario mixed --record mixed.jsonl
+    python replay.py --trace mixed.jsonl --speed 2
+"""
+import argparse
+import asyncio
+import atexit
+import datetime
+import glob
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import discord
+from discord.webhook.async_ import AsyncWebhookAdapter, async_context
+
+import storage
+
+DATA_FILES = ("honor.json", "user_stats.json", "user_skills.json", "armory.json", "players.snapshot", "davis.db")
+USER_ID_BASE = 100_000_000_000_000_000
+VIEW_OWNER = re.compile(r"davis:\w+:(\d+):")
+
+MIXED_ACTIONS = [
+    ({"content": ">patrol"}, 15),
+    ({"content": ">scavenge"}, 15),
+    ({"content": ">scavenge 5"}, 5),
+    ({"content": ">armory"}, 12),
+    ({"component": "davis:armory:{user}:page:"}, 10),
+    ({"component": "davis:armory:{user}:quantity:"}, 4),
+    ({"component": "davis:armory:{user}:craft:"}, 6),
+    ({"content": ">craft"}, 4),
+    ({"content": ">train"}, 8),
+    ({"component": "davis:train:{user}:"}, 8),
+    ({"component": "davis:patrol:{user}:attack:"}, 6),
+    ({"content": ">honor"}, 4),
+    ({"content": ">stats"}, 2),
+    ({"content": ">top"}, 1),
+]
+# Components are clicked by a member who has already run the command that shows them.
+VIEW_COMMANDS = {"armory": ">armory", "train": ">train", "patrol": ">patrol"}
+
+
+def synthetic_trace(scenario, users, rate, duration, seed):
+    """Poisson arrivals at rate events/second from members 1..users, opened by the owner where needed."""
+    rng = random.Random(seed)
+    events = []
+    if scenario == "boss":
+        events.append({"at": 0.0, "user": 0, "content": ">worldboss Replay Boss | Synthetic load | 10000000"})
+    elif scenario == "raid":
+        events.append({"at": 0.0, "user": 0, "content": ">forceattack"})
+    actions, weights = zip(*MIXED_ACTIONS)
+    viewers = {command: [] for command in VIEW_COMMANDS.values()}
+    at = 0.5
+    while True:
+        at += rng.expovariate(rate)
+        if at >= duration:
+            return events
+        user = rng.randint(1, users)
+        if scenario == "boss":
+            action = {"content": ">hit"}
+        elif scenario == "raid":
+            action = {"content": ">defend"}
+        else:
+            action = rng.choices(actions, weights)[0]
+            if "component" in action:
+                command = VIEW_COMMANDS[component_label(action["component"]).split(":")[0]]
+                if viewers[command]:
+                    user = rng.choice(viewers[command])
+                else:
+                    action = {"content": command}
+            if action.get("content") in viewers:
+                viewers[action["content"]].append(user)
+        events.append({"at": round(at, 4), "user": user, **action})
+
+
+def component_label(prefix):
+    """"davis:armory:{user}:page:" -> "armory:page"."""
+    return ":".join(part for part in prefix.split(":")[1:] if part and part != "{user}")
+
+
+class FakeDiscord:
+    """Answers the bot's REST and interaction webhook calls and keeps the messages it sent for later clicks."""
+
+    def __init__(self, bot, rest_latency, seed):
+        self.bot = bot
+        self.state = bot._connection
+        self.rest_latency = rest_latency
+        self.random = random.Random(seed)
+        self.ids = itertools.count(USER_ID_BASE * 10)
+        self.rest_calls = Counter()
+        self.messages = {}
+        self.views = {}
+        self.responded = {}
+
+    def snowflake(self):
+        return next(self.ids)
+
+    def build_guild(self, users, owner_id, rank_roles):
+        self.guild_id = self.snowflake()
+        self.channel_id = self.snowflake()
+        roles = [{"id": str(self.guild_id), "name": "@everyone", "permissions": "0", "position": 0}]
+        for position, name in enumerate(rank_roles, start=1):
+            roles.append({"id": str(self.snowflake()), "name": name, "permissions": "0", "position": position})
+        self.member_ids = [owner_id] + [USER_ID_BASE + i for i in range(1, users + 1)]
+        rank_ids = [role["id"] for role in roles[1:]]
+        members = [self.member_payload(self.bot.user.id, [])]
+        for index, user_id in enumerate(self.member_ids):
+            members.append(self.member_payload(user_id, [self.random.choice(rank_ids[:5])] if index else []))
+        channels = [{"id": str(self.channel_id), "type": 0, "name": "general", "position": 0,
+                     "permission_overwrites": []}]
+        guild = self.state._add_guild_from_data({
+            "id": str(self.guild_id), "name": "Replay", "owner_id": str(owner_id), "roles": roles,
+            "members": members, "channels": channels, "member_count": len(members), "emojis": [], "stickers": [],
+            "features": [], "large": False})
+        return guild
+
+    def user_payload(self, user_id):
+        return {"id": str(user_id), "username": f"user{user_id % 100000}", "discriminator": "0",
+                "global_name": None, "avatar": None, "bot": user_id == self.bot.user.id}
+
+    def member_payload(self, user_id, roles):
+        return {"user": self.user_payload(user_id), "roles": roles, "joined_at": "2024-01-01T00:00:00+00:00",
+                "deaf": False, "mute": False, "flags": 0}
+
+    def current_member_payload(self, user_id):
+        member = self.state._get_guild(self.guild_id).get_member(user_id)
+        roles = [str(role.id) for role in member.roles if not role.is_default()] if member else []
+        return self.member_payload(user_id, roles)
+
+    def message_payload(self, author_id, content="", message_id=None, body=None):
+        body = body or {}
+        payload = {"id": str(message_id or self.snowflake()), "channel_id": str(self.channel_id),
+                   "guild_id": str(self.guild_id), "author": self.user_payload(author_id), "content": content,
+                   "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(), "edited_timestamp": None,
+                   "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+                   "embeds": body.get("embeds", []), "components": body.get("components", []),
+                   "pinned": False, "type": 0, "flags": 0}
+        if author_id != self.bot.user.id:
+            payload["member"] = {key: value for key, value in self.current_member_payload(author_id).items()
+                                 if key != "user"}
+        return payload
+
+    def remember(self, payload):
+        """Stores a message the bot sent; one with a view becomes its owner's latest view."""
+        self.messages[payload["id"]] = payload
+        for row in payload.get("components", []):
+            for component in row.get("components", []):
+                match = VIEW_OWNER.match(component.get("custom_id", ""))
+                if match:
+                    self.views[int(match[1])] = payload["id"]
+                    return
+
+    async def request(self, route, **kwargs):
+        self.rest_calls[f"{route.method} {route.path}"] += 1
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+        body = kwargs.get("json") or {}
+        if route.path == "/channels/{channel_id}/messages" and route.method == "POST":
+            payload = self.message_payload(self.bot.user.id, body.get("content") or "", body=body)
+            self.remember(payload)
+            return payload
+        if route.path == "/channels/{channel_id}/messages/{message_id}" and route.method == "PATCH":
+            message_id = route.url.rsplit("/", 1)[1]
+            payload = dict(self.messages.get(message_id) or self.message_payload(self.bot.user.id,
+                                                                                 message_id=message_id))
+            payload.update({key: value for key, value in body.items() if key in ("content", "embeds", "components")})
+            self.remember(payload)
+            return payload
+        if route.path == "/guilds/{guild_id}/members/{user_id}" and route.method == "PATCH":
+            return self.member_payload(int(route.url.rsplit("/", 1)[1]), body.get("roles", []))
+        return None
+
+    async def webhook_request(self, route, session=None, *, payload=None, multipart=None, files=None,
+                              params=None, **kwargs):
+        self.rest_calls[f"{route.method} {route.path}"] += 1
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+        if payload is None and multipart:
+            payload = json.loads(multipart[0]["value"])
+        payload = payload or {}
+        if route.path.endswith("/callback"):
+            interaction_id = int(route.webhook_id)
+            self.responded.setdefault(interaction_id, time.perf_counter())
+            data = payload.get("data") or {}
+            message_id = self.interaction_messages.pop(interaction_id, None)
+            if payload.get("type") == 7 and message_id in self.messages:
+                message = dict(self.messages[message_id])
+                message.update({key: value for key, value in data.items() if key in ("embeds", "components")})
+                self.messages[message_id] = message
+            return {"interaction": {"id": str(interaction_id), "type": 3}}
+        if route.method == "POST":
+            return self.message_payload(self.bot.user.id, payload.get("content") or "", body=payload)
+        return None
+
+    def install(self):
+        fake = self
+
+        class ReplayWebhookAdapter(AsyncWebhookAdapter):
+            async def request(self, route, session=None, **kwargs):
+                return await fake.webhook_request(route, session, **kwargs)
+
+        self.interaction_messages = {}
+        self.bot.http.request = self.request
+        async_context.set(ReplayWebhookAdapter())
+
+    def message_event(self, user_id, content):
+        payload = self.message_payload(user_id, content)
+        self.state.parse_message_create(payload)
+        return int(payload["id"])
+
+    def interaction_event(self, user_id, prefix, values=None):
+        """Clicks the first matching component on user_id's latest view; None if they have no such view."""
+        message = self.messages.get(self.views.get(user_id))
+        component = message and next(
+            (c for row in message.get("components", []) for c in row.get("components", [])
+             if c.get("custom_id", "").startswith(prefix)), None)
+        if component is None:
+            return None
+        interaction_id = self.snowflake()
+        data = {"custom_id": component["custom_id"], "component_type": component["type"]}
+        if component["type"] == 3:
+            data["values"] = values or [self.random.choice(component["options"])["value"]]
+        self.interaction_messages[interaction_id] = message["id"]
+        channel = {"id": str(self.channel_id), "type": 0, "guild_id": str(self.guild_id), "name": "general",
+                   "position": 0, "permission_overwrites": []}
+        member = self.current_member_payload(user_id)
+        member["permissions"] = "0"
+        self.state.parse_interaction_create({
+            "id": str(interaction_id), "application_id": str(self.bot.user.id), "type": 3,
+            "token": f"replay-{interaction_id}", "version": 1, "attachment_size_limit": 8 * 1024 * 1024,
+            "guild_id": str(self.guild_id), "channel_id": str(self.channel_id), "channel": channel, "member": member,
+            "message": message, "data": data, "app_permissions": "0", "locale": "en-US", "entitlements": [],
+            "authorizing_integration_owners": {}, "context": 0})
+        return interaction_id
+
+
+class WriteCounter:
+    """Counts the storage layer's file writes: atomic file replacements, journal appends and SQLite commits."""
+
+    def __init__(self, storage, store):
+        self.writes = Counter()
+        self.bytes = Counter()
+        atomic_write = storage.atomic_write
+        write_batch = storage.Journal.write_batch
+        flush_sync = store.flush_sync
+        counter = self
+
+        def counted_atomic_write(file_path, payload):
+            counter.add(os.path.basename(file_path), len(payload))
+            return atomic_write(file_path, payload)
+
+        def counted_write_batch(journal, batch):
+            counter.add(os.path.basename(journal.base_path) + " (append)", sum(len(line) + 1 for line in batch[1]))
+            return write_batch(journal, batch)
+
+        def counted_flush_sync():
+            if getattr(store, "_conn", None) is not None and store.pending:
+                counter.add("sqlite commit", 0)
+            return flush_sync()
+
+        storage.atomic_write = counted_atomic_write
+        storage.Journal.write_batch = counted_write_batch
+        store.flush_sync = counted_flush_sync
+
+    def add(self, name, size):
+        self.writes[name] += 1
+        self.bytes[name] += size
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def prepare_data_dir(source):
+    """Copies the bot's data files from source into a scratch directory and returns its path."""
+    scratch = tempfile.mkdtemp(prefix="davis-replay-")
+    for name in DATA_FILES:
+        if os.path.exists(os.path.join(source, name)):
+            shutil.copy2(os.path.join(source, name), scratch)
+    for path in glob.glob(os.path.join(glob.escape(source), "data.journal.*")):
+        shutil.copy2(path, scratch)
+    return scratch
+
+
+async def replay(bot_module, events, args):
+    bot = bot_module.bot
+    await bot._async_setup_hook()
+    state = bot._connection
+    state.user = discord.ClientUser(state=state, data={"id": str(USER_ID_BASE - 1), "username": "davis",
+                                                       "discriminator": "0", "avatar": None, "bot": True})
+    state.application_id = state.user.id
+    fake = FakeDiscord(bot, args.rest_latency, args.seed)
+    fake.install()
+    guild = fake.build_guild(args.users, bot_module.OWNER_ID, [rank["name"] for rank in bot_module.RANK_ROLES])
+    bot_module.game_states.get(guild.id).attack_channel_id = fake.channel_id
+    bot._ready.set()
+    await bot_module.on_ready()
+
+    writes = WriteCounter(storage, bot_module.store)
+    injected = {}
+    latencies = defaultdict(list)
+    errors = Counter()
+    rejections = Counter()
+    skipped = Counter()
+
+    def finish(ctx, error=None):
+        started = injected.pop(ctx.message.id, None)
+        if started is None:
+            return
+        label, started = started
+        name = ctx.command.qualified_name if ctx.command else label
+        latencies[name].append(time.perf_counter() - started)
+        if error is not None:
+            # Cooldowns, failed checks and bad input are the bot working as intended; count them apart.
+            counts = rejections if isinstance(error, bot_module.COMMAND_REJECTIONS) else errors
+            counts[(name, type(getattr(error, "original", error)).__name__)] += 1
+
+    async def on_command_completion(ctx):
+        finish(ctx)
+
+    async def on_command_error(ctx, error):
+        finish(ctx, error)
+
+    bot.add_listener(on_command_completion)
+    bot.add_listener(on_command_error)
+
+    print(f"Replaying {len(events)} events from {args.users} members"
+          f"{'' if not args.speed or args.speed == 1 else f' at {args.speed}x speed'}...")
+    started = time.perf_counter()
+    components = {}
+    for event in events:
+        delay = started + event["at"] / args.speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        user_id = fake.member_ids[event["user"] % len(fake.member_ids)]
+        if "content" in event:
+            injected[fake.message_event(user_id, event["content"])] = (event["content"].split()[0],
+                                                                       time.perf_counter())
+        else:
+            prefix = event["component"].replace("{user}", str(user_id))
+            interaction_id = fake.interaction_event(user_id, prefix, event.get("values"))
+            if interaction_id is None:
+                skipped[component_label(event["component"])] += 1
+            else:
+                components[interaction_id] = (component_label(event["component"]), time.perf_counter())
+        await asyncio.sleep(0)
+    sent = time.perf_counter() - started
+
+    deadline = time.perf_counter() + args.drain
+    while (injected or set(components) - set(fake.responded)) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    for interaction_id, (label, clicked) in components.items():
+        if interaction_id in fake.responded:
+            latencies[label].append(fake.responded[interaction_id] - clicked)
+        else:
+            skipped[label + " (no response)"] += 1
+    elapsed = time.perf_counter() - started
+    await bot_module.store.flush()
+    bot_module.loop_watchdog.stop()
+    # Commands still running are cancelled when the loop shuts down; copy the results before that happens.
+    return {"sent": sent, "elapsed": elapsed, "errors": Counter(errors), "rejections": Counter(rejections),
+            "skipped": skipped,
+            "latencies": {label: list(samples) for label, samples in latencies.items()},
+            "pending": Counter(label for label, _ in injected.values()), "rest": fake.rest_calls,
+            "writes": writes, "stalls": bot_module.loop_stalls.most_common(5),
+            "max_lag": bot_module.loop_watchdog.max_lag}
+
+
+def report(results, event_count):
+    latencies = results["latencies"]
+    completed = sum(len(samples) for samples in latencies.values())
+    print(f"\nSent {event_count} events in {results['sent']:.1f}s; {completed} completed in {results['elapsed']:.1f}s "
+          f"({completed / results['elapsed']:.0f}/s).")
+    print(f"\n{'event':<22}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}"
+          f"{'rejected':>10}")
+    for label, samples in sorted(latencies.items(), key=lambda item: -len(item[1])):
+        label_errors, label_rejections = (sum(count for (name, _), count in results[key].items() if name == label)
+                                          for key in ("errors", "rejections"))
+        print(f"{label:<22}{len(samples):>7}{percentile(samples, 0.5) * 1000:>9.1f}"
+              f"{percentile(samples, 0.95) * 1000:>9.1f}{percentile(samples, 0.99) * 1000:>9.1f}"
+              f"{max(samples) * 1000:>9.1f}{label_errors:>8}{label_rejections:>10}")
+    for title, key in (("Errors", "errors"), ("Rejected", "rejections")):
+        if results[key]:
+            print(f"{title}:")
+            for (label, kind), count in sorted(results[key].items()):
+                print(f"  {label}: {count}x {kind}")
+    for title, counts in (("Still running", results["pending"]), ("Skipped", results["skipped"])):
+        if counts:
+            print(f"{title}: " + ", ".join(f"{label} {count}" for label, count in counts.most_common()))
+
+    rest = results["rest"]
+    print(f"\nREST calls: {sum(rest.values())}")
+    for route, count in rest.most_common():
+        print(f"  {count:>7}  {route}")
+    writes = results["writes"]
+    print(f"File writes: {sum(writes.writes.values())}")
+    for name, count in writes.writes.most_common():
+        print(f"  {count:>7}  {name}" + (f" ({writes.bytes[name]:,} bytes)" if writes.bytes[name] else ""))
+    print(f"\nEvent loop: max lag {results['max_lag'] * 1000:.0f} ms"
+          + "".join(f"\n  {count}x stalled in {culprit}" for culprit, count in results["stalls"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trace", help="Replay this JSON lines trace instead of a synthetic scenario.")
+    parser.add_argument("--scenario", choices=["boss", "raid", "mixed"], default="mixed")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=100, help="Synthetic events per second.")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of synthetic traffic.")
+    parser.add_argument("--speed", type=float, default=1, help="Replay speed multiplier for the trace.")
+    parser.add_argument("--record", help="Write the synthetic trace to this file as well.")
+    parser.add_argument("--rest-latency", type=float, default=0.05, help="Seconds each fake REST call takes.")
+    parser.add_argument("--drain", type=float, default=5, help="Seconds to wait for outstanding events.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=".", help="Data files to copy into the scratch directory.")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    if args.trace:
+        with open(args.trace) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        args.users = max([event["user"] for event in events] + [1])
+    else:
+        events = synthetic_trace(args.scenario, args.users, args.rate, args.duration, args.seed)
+        if args.record:
+            with open(args.record, "w") as f:
+                f.writelines(json.dumps(event) + "\n" for event in events)
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    scratch = prepare_data_dir(os.path.abspath(args.data_dir))
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "replay")
+    os.environ.update({"METRICS_PORT": "0", "GAME_SEED": str(args.seed), "STORAGE_BACKEND": args.backend})
+    # Registered before the bot registers its exit flush, so it runs after that flush has written to scratch.
+    atexit.register(shutil.rmtree, scratch, True)
+    os.chdir(scratch)
+    sys.path.insert(0, repo)
+    import DavisDefenseBot
+    report(asyncio.run(replay(DavisDefenseBot, events, args)), len(events))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+
+class RoleSyncQueue:
+    """Background queue for rank role updates.
+
+    Pending updates are keyed per member, so any number of honor changes before the worker gets to a
+    member collapse into a single role edit computed from their final honor. Edits are spaced at least
+    min_interval apart per guild to stay under the member-edit rate limit bucket; while one guild waits out
+    its interval the worker serves members of the others.
+    """
+
+    def __init__(self, sync, min_interval=0.5):
+        self._sync = sync
+        self.min_interval = min_interval
+        # guild ID -> (guild, member IDs in enqueue order)
+        self._pending = {}
+        self._next_allowed = {}
+        self._wakeup = asyncio.Event()
+        self._worker = None
+        self.processed = 0
+        self.edits = 0
+
+    @property
+    def depth(self):
+        return sum(len(members) for _, members in self._pending.values())
+
+    def enqueue(self, member):
+        entry = self._pending.get(member.guild.id)
+        if entry is None:
+            entry = self._pending[member.guild.id] = (member.guild, {})
+        # Members are keyed by ID only, so the worker fetches their latest state however often they're enqueued.
+        entry[1][member.id] = None
+        self._wakeup.set()
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    def _ready_guild(self):
+        """The guild whose rate limit frees up first; guilds that are already free go in enqueue order."""
+        return min(self._pending, key=lambda guild_id: self._next_allowed.get(guild_id, 0))
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            guild_id = self._ready_guild()
+            delay = self._next_allowed.get(guild_id, 0) - time.monotonic()
+            if delay > 0:
+                # Every pending guild is rate limited; an enqueue for a new guild may be ready sooner.
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            guild, members = self._pending[guild_id]
+            member_id = next(iter(members))
+            del members[member_id]
+            if not members:
+                del self._pending[guild_id]
+            member = guild.get_member(member_id)
+            if member is None:
+                continue
+            try:
+                edited = await self._sync(member)
+            except Exception as e:
+                print(f"ERROR: Role sync failed for {member.name}: {e}")
+                edited = True
+            self.processed += 1
+            if edited:
+                self.edits += 1
+                self._next_allowed[guild_id] = time.monotonic() + self.min_interval
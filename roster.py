@@ -0,0 +1,109 @@
+import bisect
+
+
+class RosterCache:
+    """Per-guild rank rosters kept sorted by display name and rendered into embed-sized pages.
+
+    Rosters are built once per guild and then patched member by member from update events; the rendered
+    pages are only regenerated after something in that guild's roster actually changed.
+    """
+
+    def __init__(self, rank_names, page_limit=4000):
+        self.rank_names = list(rank_names)
+        self.page_limit = page_limit
+        self._lists = {}
+        self._entries = {}
+        self._pages = {}
+
+    def is_built(self, guild_id):
+        return guild_id in self._lists
+
+    def build(self, guild_id, rank_members):
+        """rank_members maps each rank name to the members currently holding that rank's role."""
+        held = {}
+        for rank_name in self.rank_names:
+            for member in rank_members.get(rank_name, ()):
+                held.setdefault(member.id, (member.display_name, []))[1].append(rank_name)
+        lists = {rank_name: [] for rank_name in self.rank_names}
+        entries = {}
+        for member_id, (display_name, ranks) in held.items():
+            entries[member_id] = (display_name, tuple(ranks))
+            for rank_name in ranks:
+                lists[rank_name].append((display_name, member_id))
+        for members in lists.values():
+            members.sort()
+        self._lists[guild_id] = lists
+        self._entries[guild_id] = entries
+        self._pages.pop(guild_id, None)
+
+    def update_member(self, guild_id, member_id, display_name, rank_names):
+        if guild_id not in self._lists:
+            return
+        new = (display_name, tuple(rank_name for rank_name in self.rank_names if rank_name in rank_names))
+        old = self._entries[guild_id].get(member_id)
+        if old == new:
+            return
+        self._remove(guild_id, member_id, old)
+        if new[1]:
+            self._entries[guild_id][member_id] = new
+            for rank_name in new[1]:
+                bisect.insort(self._lists[guild_id][rank_name], (display_name, member_id))
+        self._pages.pop(guild_id, None)
+
+    def remove_member(self, guild_id, member_id):
+        if guild_id not in self._lists:
+            return
+        old = self._entries[guild_id].get(member_id)
+        if old:
+            self._remove(guild_id, member_id, old)
+            self._pages.pop(guild_id, None)
+
+    def _remove(self, guild_id, member_id, old):
+        if not old:
+            return
+        display_name, ranks = old
+        for rank_name in ranks:
+            members = self._lists[guild_id][rank_name]
+            del members[bisect.bisect_left(members, (display_name, member_id))]
+        del self._entries[guild_id][member_id]
+
+    def forget(self, guild_id):
+        self._lists.pop(guild_id, None)
+        self._entries.pop(guild_id, None)
+        self._pages.pop(guild_id, None)
+
+    def pages(self, guild_id):
+        pages = self._pages.get(guild_id)
+        if pages is None:
+            pages = self._pages[guild_id] = self._render(self._lists[guild_id])
+        return pages
+
+    def _render(self, lists):
+        pages, page, used = [], [], 0
+        for rank_name in self.rank_names:
+            members = lists[rank_name]
+            if not members:
+                continue
+            header = f"**{rank_name}**: "
+            chunk, length = [], len(header)
+            lines = []
+            for _, member_id in members:
+                mention = f"<@{member_id}>"
+                if chunk and length + 2 + len(mention) > self.page_limit:
+                    lines.append(header + ", ".join(chunk))
+                    header = f"**{rank_name}** (cont.): "
+                    chunk, length = [], len(header)
+                length += (2 if chunk else 0) + len(mention)
+                chunk.append(mention)
+            lines.append(header + ", ".join(chunk))
+            for line in lines:
+                cost = len(line) + (1 if page else 0)
+                if page and used + cost > self.page_limit:
+                    pages.append("\n".join(page))
+                    page, cost = [], len(line)
+                    used = 0
+                page.append(line)
+                used += cost
+        if page:
+            pages.append("\n".join(page))
+        return pages
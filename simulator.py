@@ -0,0 +1,218 @@
+"""Offline Monte Carlo balance simulator for patrols, raids, world bosses and scavenging.
+
+Mirrors the formulas in engine.py with NumPy and samples players from the real data files, so
+changes to game_data.py (rank weights, rarity weights, recipes) or to the constants below can be checked
+before they ship. Large sweeps are split across a process pool.
+
+    python simulator.py --trials 1000000 --workers 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from game_data import RANK_ROLES, MATERIALS, MATERIAL_RARITY_WEIGHTS, RECIPES
+from players import Player, PlayerTable, ITEM_INDEX, HONOR, SKILLS
+from snapshot import PlayerSnapshot
+from storage import load_json
+from engine import (ATTACK_LOW_FACTOR, ATTACK_BONUS, ATTACK_HONOR, ATTACK_CHANCE_PER_CHECK, PATROL_ENCOUNTER_CHANCE,
+                    PATROL_UNEVENTFUL_HONOR, PATROL_VICTORY_HONOR, BOSS_DAMAGE, BOSS_HONOR, SCAVENGE_BASE_ITEMS,
+                    difficulty_mod, patrol_win_chance, endurance_cooldown)
+
+ATTACK_CHECKS_PER_HOUR = 60
+BOSS_HITS_PER_PLAYER = 30
+
+
+def load_players(data_dir="."):
+    """Per-player arrays built from the bot's player snapshot, or from the legacy JSON files before migration.
+
+    Rank is inferred from honor, since the data doesn't record Discord roles.
+    """
+    snapshot = PlayerSnapshot(os.path.join(data_dir, "players.snapshot"), PlayerTable())
+    if snapshot.exists():
+        snapshot.load()
+        table = snapshot.table
+    else:
+        table = PlayerTable.from_json(*(load_json(os.path.join(data_dir, name)) for name in
+                                        ("honor.json", "user_stats.json", "user_skills.json", "armory.json")))
+    players = [player for player in table if player.sections & (HONOR | SKILLS)] or [Player(0)]
+
+    thresholds = np.array([rank["honor"] for rank in RANK_ROLES])
+    weights = np.array([rank["weight"] for rank in RANK_ROLES])
+    honor_values = np.array([player.honor for player in players])
+    rank_index = np.clip(np.searchsorted(thresholds, honor_values, side="right") - 1, 0, None)
+
+    weapons = [(recipe["weight_bonus"], ITEM_INDEX[name]) for name, recipe in RECIPES.items()
+               if recipe["type"] == "weapon"]
+    weapon_bonus = [max((bonus for bonus, index in weapons if player.items[index] > 0), default=0)
+                    for player in players]
+
+    def skill(name):
+        return np.array([getattr(player, name) for player in players])
+
+    return {
+        "rank_weight": weights[rank_index],
+        "weapon_bonus": np.array(weapon_bonus),
+        "strength": skill("strength"),
+        "agility": skill("agility"),
+        "intelligence": skill("intelligence"),
+        "endurance": skill("endurance"),
+    }
+
+
+def _chunks(total, size):
+    while total > 0:
+        yield min(total, size)
+        total -= size
+
+
+def _uniform_sum(rng, low, high, count, size):
+    """Sum of `count` independent uniform integers in [low, high], drawn via one multinomial per trial."""
+    values = np.arange(low, high + 1)
+    counts = rng.multinomial(count, np.full(len(values), 1 / len(values)), size=size)
+    return counts @ values
+
+
+def simulate_attacks(players, defender_counts, trials, seed):
+    rng = np.random.default_rng(seed)
+    power = players["rank_weight"] + players["agility"]
+    wins = np.zeros(len(defender_counts), dtype=np.int64)
+    for i, num_defenders in enumerate(defender_counts):
+        for size in _chunks(trials, max(1, 4_000_000 // num_defenders)):
+            defense = power[rng.integers(0, len(power), size=(size, num_defenders))].sum(axis=1)
+            low = (defense * ATTACK_LOW_FACTOR).astype(np.int64)
+            high = (defense * difficulty_mod(num_defenders)).astype(np.int64)
+            attack = rng.integers(low, high + 1) + ATTACK_BONUS
+            wins[i] += np.count_nonzero(defense >= attack)
+    return (wins,)
+
+
+def simulate_patrols(trials, seed):
+    """Honor per patrol for every rank, assuming the player always chooses to attack an encounter."""
+    rng = np.random.default_rng(seed)
+    weights = np.array([rank["weight"] for rank in RANK_ROLES])
+    wins = np.zeros(len(weights), dtype=np.int64)
+    honor = np.zeros(len(weights), dtype=np.int64)
+    for i, weight in enumerate(weights):
+        for size in _chunks(trials, 2_000_000):
+            encounter = rng.random(size) < PATROL_ENCOUNTER_CHANCE
+            victory = encounter & (rng.random(size) < patrol_win_chance(weight))
+            uneventful = rng.integers(PATROL_UNEVENTFUL_HONOR[0], PATROL_UNEVENTFUL_HONOR[1] + 1, size=size)
+            reward = rng.integers(PATROL_VICTORY_HONOR[0], PATROL_VICTORY_HONOR[1] + 1, size=size)
+            wins[i] += np.count_nonzero(victory)
+            honor[i] += uneventful[~encounter].sum() + reward[victory].sum()
+    return wins, honor
+
+
+def simulate_bosses(players, participant_counts, hp_levels, hits, trials, seed):
+    rng = np.random.default_rng(seed)
+    per_hit = players["rank_weight"] + players["weapon_bonus"] + players["strength"]
+    kills = np.zeros((len(participant_counts), len(hp_levels)), dtype=np.int64)
+    damage = np.zeros(len(participant_counts), dtype=np.float64)
+    hp = np.array(hp_levels)
+    for i, participants in enumerate(participant_counts):
+        for size in _chunks(trials, max(1, 4_000_000 // participants)):
+            fixed = per_hit[rng.integers(0, len(per_hit), size=(size, participants))].sum(axis=1) * hits
+            total = fixed + _uniform_sum(rng, BOSS_DAMAGE[0], BOSS_DAMAGE[1], participants * hits, size)
+            kills[i] += (total[:, None] >= hp[None, :]).sum(axis=0)
+            damage[i] += total.sum()
+    return kills, damage
+
+
+def simulate_scavenges(intelligence_levels, trials, seed):
+    rng = np.random.default_rng(seed)
+    weights = np.array([MATERIAL_RARITY_WEIGHTS[m["rarity"]] for m in MATERIALS], dtype=np.float64)
+    probabilities = weights / weights.sum()
+    found = np.zeros((len(intelligence_levels), len(MATERIALS)), dtype=np.int64)
+    for i, intelligence in enumerate(intelligence_levels):
+        for size in _chunks(trials, 1_000_000):
+            items = rng.integers(SCAVENGE_BASE_ITEMS[0], SCAVENGE_BASE_ITEMS[1] + 1, size=size) + intelligence // 10
+            found[i] += rng.multinomial(items, probabilities).sum(axis=0)
+    return (found,)
+
+
+def _run(task):
+    func, args, trials, seed = task
+    return func(*args, trials=trials, seed=seed)
+
+
+def run_parallel(func, args, trials, workers, seed):
+    """Splits trials across worker processes with independent seeds and sums their result arrays."""
+    seeds = np.random.SeedSequence(seed).spawn(max(1, workers))
+    shares = [trials // len(seeds) + (1 if i < trials % len(seeds) else 0) for i in range(len(seeds))]
+    tasks = [(func, args, share, child) for share, child in zip(shares, seeds) if share]
+    if workers <= 1:
+        results = [_run(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run, tasks))
+    return tuple(sum(parts) for parts in zip(*results))
+
+
+def print_table(title, headers, rows):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    print(f"\n{title}")
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(cell).rjust(w) for cell, w in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trials", type=int, default=100_000, help="Trials per table cell.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--data-dir", default=".")
+    parser.add_argument("--defenders", type=int, nargs="+", default=[1, 3, 5, 10, 20, 50])
+    parser.add_argument("--participants", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--boss-hp", type=int, nargs="+", default=[5_000, 25_000, 100_000, 250_000])
+    parser.add_argument("--intelligence", type=int, nargs="+", default=[1, 25, 50, 100])
+    args = parser.parse_args()
+
+    players = load_players(args.data_dir)
+    print(f"Loaded {len(players['rank_weight'])} players; {args.trials:,} trials per cell on {args.workers} worker(s).")
+    started = time.perf_counter()
+
+    wins, = run_parallel(simulate_attacks, (players, args.defenders), args.trials, args.workers, args.seed)
+    mean_attack_honor = sum(ATTACK_HONOR) / 2
+    attacks_per_hour = ATTACK_CHECKS_PER_HOUR * ATTACK_CHANCE_PER_CHECK
+    print_table("Raid defense", ["defenders", "win rate", "honor/defender/raid", "honor/defender/hour"], [
+        (n, f"{w / args.trials:.1%}", f"{w / args.trials * mean_attack_honor:.1f}",
+         f"{w / args.trials * mean_attack_honor * attacks_per_hour:.1f}")
+        for n, w in zip(args.defenders, wins)])
+
+    patrol_wins, patrol_honor = run_parallel(simulate_patrols, (), args.trials, args.workers, args.seed)
+    fastest, slowest = 3600 / endurance_cooldown(100), 3600 / endurance_cooldown(1)
+    print_table("Patrol (always attacking encounters)",
+                ["rank", "weight", "win rate", "honor/patrol", "honor/hour @End 1", "honor/hour @End 100"], [
+                    (rank["name"], rank["weight"], f"{w / (args.trials * PATROL_ENCOUNTER_CHANCE):.1%}",
+                     f"{h / args.trials:.1f}", f"{h / args.trials * slowest:.0f}", f"{h / args.trials * fastest:.0f}")
+                    for rank, w, h in zip(RANK_ROLES, patrol_wins, patrol_honor)])
+
+    kills, damage = run_parallel(simulate_bosses, (players, args.participants, args.boss_hp, BOSS_HITS_PER_PLAYER),
+                                 args.trials, args.workers, args.seed)
+    print_table(f"World boss ({BOSS_HITS_PER_PLAYER} hits per participant)",
+                ["participants", "mean damage"] + [f"kill @{hp:,} HP" for hp in args.boss_hp], [
+                    [n, f"{d / args.trials:,.0f}"] + [f"{k / args.trials:.1%}" for k in row]
+                    for n, d, row in zip(args.participants, damage, kills)])
+    mean_boss_honor = sum(BOSS_HONOR) / 2
+    print(f"Honor per participant per defeated boss: {mean_boss_honor:.0f} on average.")
+
+    found, = run_parallel(simulate_scavenges, (args.intelligence,), args.trials, args.workers, args.seed)
+    per_run = found / args.trials
+    print_table("Scavenging yield per run", ["intel"] + [m["name"] for m in MATERIALS], [
+        [level] + [f"{amount:.2f}" for amount in row] for level, row in zip(args.intelligence, per_run)])
+    index = {m["name"]: i for i, m in enumerate(MATERIALS)}
+    print_table("Scavenge runs needed per craft", ["intel"] + list(RECIPES), [
+        [level] + [f"{max(amount / row[index[mat]] for mat, amount in recipe['materials'].items()):.0f}"
+                   for recipe in RECIPES.values()]
+        for level, row in zip(args.intelligence, per_run)])
+
+    print(f"\nFinished in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import json
+import os
+import struct
+from array import array
+from operator import attrgetter
+
+from players import Player, MATERIAL_NAMES, ITEM_NAMES, SKILL_NAMES, STAT_NAMES
+
+FORMAT_VERSION = 1
+BINARY_MAGIC = b"DDBP"
+# user_id, sections, honor, then the skills and stats in SKILL_NAMES/STAT_NAMES order.
+SCALAR_FIELDS = ("user_id", "sections", "honor") + SKILL_NAMES + STAT_NAMES
+_scalars = attrgetter(*SCALAR_FIELDS)
+SCALARS = struct.Struct("<qBq" + "q" * (len(SKILL_NAMES) + len(STAT_NAMES)))
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class PlayerSnapshot:
+    """Versioned single-file snapshot of a PlayerTable, written as compact JSON lines or packed binary records.
+
+    Both encodings start with a header naming the format version and the material/item order the arrays were
+    written in, so reordering or adding entries in game_data doesn't corrupt older snapshots. The loader
+    streams one player at a time and detects the encoding from the first bytes of the file.
+    """
+
+    def __init__(self, path, table, binary=False):
+        self.path = path
+        self.table = table
+        self.binary = binary
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def _header(self):
+        return {"version": FORMAT_VERSION, "fields": list(SCALAR_FIELDS), "materials": list(MATERIAL_NAMES),
+                "items": list(ITEM_NAMES)}
+
+    def capture(self):
+        """A copy of every player's fields that encode() can serialize later, e.g. from another thread.
+
+        This only copies scalars and raw array bytes, so it's cheap enough to run on the event loop.
+        """
+        return [(_scalars(player), player.materials.tobytes(), player.items.tobytes()) for player in self.table]
+
+    def encode(self, captured=None):
+        """The snapshot file's bytes, for captured (from capture()) or the table's current state."""
+        if captured is None:
+            captured = self.capture()
+        if self.binary:
+            header = json.dumps(self._header()).encode()
+            parts = [BINARY_MAGIC, struct.pack("<I", len(header)), header]
+            for scalars, materials, items in captured:
+                parts.append(SCALARS.pack(*scalars))
+                parts.append(materials)
+                parts.append(items)
+            return b"".join(parts)
+        lines = [json.dumps(self._header(), separators=(",", ":"))]
+        for scalars, materials, items in captured:
+            lines.append(json.dumps(list(scalars) + [array("q", materials).tolist(), array("q", items).tolist()],
+                                    separators=(",", ":")))
+        return ("\n".join(lines) + "\n").encode()
+
+    def load(self):
+        """Streams the snapshot into the table and returns the number of players loaded."""
+        with open(self.path, "rb") as f:
+            if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+                return self._load_binary(f)
+            f.seek(0)
+            return self._load_lines(f)
+
+    def _check(self, header):
+        version = header.get("version")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"{self.path} is format version {version}; this build reads version {FORMAT_VERSION}.")
+        if header["fields"] != list(SCALAR_FIELDS):
+            raise SnapshotError(f"{self.path} has unexpected fields {header['fields']}.")
+        return _remap(header["materials"], MATERIAL_NAMES), _remap(header["items"], ITEM_NAMES)
+
+    def _load_lines(self, f):
+        material_map, item_map = self._check(json.loads(f.readline()))
+        count = 0
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            player = _player(row, _arrange(row[-2], material_map, len(MATERIAL_NAMES)),
+                             _arrange(row[-1], item_map, len(ITEM_NAMES)))
+            self.table.add(player)
+            count += 1
+        return count
+
+    def _load_binary(self, f):
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length))
+        material_map, item_map = self._check(header)
+        material_bytes = 8 * len(header["materials"])
+        item_bytes = 8 * len(header["items"])
+        record_size = SCALARS.size + material_bytes + item_bytes
+        count = 0
+        while True:
+            record = f.read(record_size)
+            if not record:
+                break
+            if len(record) < record_size:
+                raise SnapshotError(f"{self.path} is truncated after {count} players.")
+            materials = array("q", record[SCALARS.size:SCALARS.size + material_bytes])
+            items = array("q", record[SCALARS.size + material_bytes:])
+            player = _player(SCALARS.unpack_from(record), _arrange(materials, material_map, len(MATERIAL_NAMES)),
+                             _arrange(items, item_map, len(ITEM_NAMES)))
+            self.table.add(player)
+            count += 1
+        return count
+
+
+def _remap(names, current):
+    """None if names matches the current order, otherwise each stored position's current index (or None)."""
+    if list(names) == list(current):
+        return None
+    index = {name: i for i, name in enumerate(current)}
+    return [index.get(name) for name in names]
+
+
+def _arrange(values, mapping, size):
+    """values as an array in the current order; stored entries that no longer exist are dropped."""
+    if mapping is None:
+        return values if isinstance(values, array) else array("q", values)
+    arranged = array("q", bytes(8 * size))
+    for position, value in enumerate(values):
+        if mapping[position] is not None:
+            arranged[mapping[position]] = value
+    return arranged
+
+
+def _player(scalars, materials, items):
+    # Skips Player.__init__, which would build default skills and zeroed arrays only to overwrite them.
+    player = Player.__new__(Player)
+    for name, value in zip(SCALAR_FIELDS, scalars):
+        setattr(player, name, value)
+    player.materials = materials
+    player.items = items
+    return player
@@ -0,0 +1,484 @@
+import asyncio
+import functools
+import glob
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+def load_json(file_path):
+    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+        with open(file_path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def as_dict(data):
+    """Tables may be any mapping in the JSON layout (e.g. a players.SectionView); json needs a real dict."""
+    return data if isinstance(data, dict) else dict(data)
+
+
+def atomic_write(file_path, payload):
+    """Writes payload to a temp file next to file_path and renames it into place."""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(payload, bytes) else "w") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class WriteBehindStore:
+    """Coalesces save requests and writes dirty JSON files from a background executor."""
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._dirty = {}
+        self._pending = 0
+        self._flush_lock = None
+        self._write_lock = threading.Lock()
+        self._flush_task = None
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def load(self, file_path):
+        return load_json(file_path)
+
+    def mark_dirty(self, file_path, data, *keys):
+        # Whole files are rewritten, so the changed keys don't matter here.
+        self._dirty[file_path] = data
+        self._pending += 1
+        if self._pending >= self.max_pending:
+            self._schedule_flush()
+
+    def record(self, op, file_path, data, user_id, **details):
+        """Persists a single typed change (e.g. op="honor", delta=50) to one user's entry in data."""
+        self.mark_dirty(file_path, data, user_id)
+
+    def record_many(self, op, file_path, data, user_ids, rows=None, **details):
+        """Persists the same typed change applied to many users' entries as a single unit.
+
+        rows, if given, maps each user ID to its row after the change. Pass it when data is a view over a
+        PlayerTable with max_resident, since a large batch can evict its own first players before it's recorded.
+        """
+        self.mark_dirty(file_path, data, *user_ids)
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self.flush())
+
+    def _take_dirty(self):
+        dirty, self._dirty, self._pending = self._dirty, {}, 0
+        # The compact dump runs in C and gives a consistent snapshot; pretty-printing happens off the loop.
+        return dirty, {path: json.dumps(as_dict(data)) for path, data in dirty.items()}
+
+    def _write(self, snapshots):
+        with self._write_lock:
+            for path, payload in snapshots.items():
+                if callable(payload):
+                    payload = payload()
+                elif isinstance(payload, str):
+                    payload = json.dumps(json.loads(payload), indent=4)
+                atomic_write(path, payload)
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, snapshots = self._take_dirty()
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, snapshots)
+            except OSError as e:
+                print(f"ERROR: Failed to flush {', '.join(snapshots)}: {e}")
+                for path, data in dirty.items():
+                    self._dirty.setdefault(path, data)
+                self._pending += len(dirty)
+
+    def flush_sync(self):
+        """Blocking flush for shutdown paths where the event loop is no longer running."""
+        if not self._dirty:
+            return
+        _, snapshots = self._take_dirty()
+        self._write(snapshots)
+
+
+class Journal:
+    """Append-only, segmented log of player data changes, written in fsync'd batches."""
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        existing = self.segments()
+        self._segment = existing[-1] + 1 if existing else 0
+        self._buffer = []
+        self._write_lock = threading.Lock()
+        self.appended_since_compaction = 0
+
+    def _segment_path(self, number):
+        return f"{self.base_path}.{number:06d}"
+
+    def segments(self):
+        numbers = []
+        for path in glob.glob(glob.escape(self.base_path) + ".*"):
+            suffix = path.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                numbers.append(int(suffix))
+        return sorted(numbers)
+
+    @property
+    def buffered(self):
+        return len(self._buffer)
+
+    def append(self, record):
+        self._buffer.append(json.dumps(record, separators=(",", ":")))
+        self.appended_since_compaction += 1
+
+    def take_batch(self):
+        if not self._buffer:
+            return None
+        batch = (self._segment_path(self._segment), self._buffer)
+        self._buffer = []
+        return batch
+
+    def requeue(self, batch):
+        """Puts a batch that failed to write back in front of anything appended since."""
+        if batch:
+            self._buffer[:0] = batch[1]
+
+    def write_batch(self, batch):
+        path, lines = batch
+        with self._write_lock:
+            with open(path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def rotate(self):
+        """Seals the current segment and returns its number; later appends go to a new segment."""
+        sealed = self._segment
+        self._segment += 1
+        self.appended_since_compaction = 0
+        return sealed
+
+    def remove_through(self, sealed):
+        for number in self.segments():
+            if number > sealed:
+                break
+            try:
+                os.remove(self._segment_path(number))
+            except FileNotFoundError:
+                pass
+
+    def replay(self):
+        for number in self.segments():
+            with open(self._segment_path(number), "r") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash mid-append can leave a torn final line; everything before it is intact.
+                        break
+
+
+class JournaledStore(WriteBehindStore):
+    """JSON snapshots plus an append-only journal; snapshots are only rewritten during compaction.
+
+    Journal records carry the full post-change entry for the user alongside the typed delta, so replaying
+    a segment that is already reflected in a snapshot is harmless.
+    """
+
+    def __init__(self, journal_path, max_pending=100, compact_every=5000, compact_interval=300.0, snapshot=None):
+        """snapshot, if given, replaces the per-file JSON snapshots with one object that has a path, a cheap
+        capture() of the current state and an encode(captured) returning the bytes to write there (e.g.
+        snapshot.PlayerSnapshot). Only capture() runs on the event loop."""
+        super().__init__(max_pending=max_pending)
+        self.snapshot = snapshot
+        self.journal = Journal(journal_path)
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self._last_compaction = time.monotonic()
+        self._force_compaction = False
+
+    def replay(self, tables):
+        """Applies journaled changes on top of freshly loaded snapshots. tables maps file names to their dicts."""
+        applied = 0
+        for entry in self.journal.replay():
+            data = tables.get(entry["file"])
+            if data is None:
+                continue
+            if entry["op"] == "snapshot":
+                data.clear()
+                data.update(entry["row"])
+            elif "rows" in entry:
+                data.update(entry["rows"])
+            elif entry["row"] is None:
+                data.pop(entry["user"], None)
+            else:
+                data[entry["user"]] = entry["row"]
+            self._dirty[entry["file"]] = data
+            applied += 1
+        # schedule_compaction() may already have forced one (e.g. a snapshot migration); keep it forced.
+        self._force_compaction = self._force_compaction or applied > 0
+        return applied
+
+    def schedule_compaction(self, tables):
+        """Marks whole tables dirty so the next flush rewrites their snapshots, e.g. after a format migration."""
+        self._dirty.update(tables)
+        self._force_compaction = True
+
+    def _take_dirty(self):
+        if self.snapshot is None:
+            return super()._take_dirty()
+        dirty, self._dirty, self._pending = self._dirty, {}, 0
+        return dirty, {self.snapshot.path: functools.partial(self.snapshot.encode, self.snapshot.capture())}
+
+    def mark_dirty(self, file_path, data, *keys):
+        if not keys:
+            self.journal.append({"op": "snapshot", "file": file_path, "row": as_dict(data)})
+            self._touch(file_path, data)
+        for key in keys:
+            self.record("set", file_path, data, key)
+
+    def record(self, op, file_path, data, user_id, **details):
+        self.journal.append({"op": op, "file": file_path, "user": user_id, **details, "row": data.get(user_id)})
+        self._touch(file_path, data)
+
+    def record_many(self, op, file_path, data, user_ids, rows=None, **details):
+        if rows is None:
+            rows = {user_id: data[user_id] for user_id in user_ids if user_id in data}
+        self.journal.append({"op": op, "file": file_path, "users": list(rows), **details, "rows": rows})
+        self._touch(file_path, data)
+
+    def _touch(self, file_path, data):
+        self._dirty[file_path] = data
+        self._pending += 1
+        if self.journal.buffered >= self.max_pending:
+            self._schedule_flush()
+
+    def _compaction_due(self):
+        if not self._dirty:
+            return False
+        return (self._force_compaction or self.journal.appended_since_compaction >= self.compact_every
+                or time.monotonic() - self._last_compaction >= self.compact_interval)
+
+    def _start_compaction(self):
+        # Rotating and capturing in the same synchronous step means the snapshots reflect exactly the
+        # sealed segments, and every later change lands in the new segment.
+        batch = self.journal.take_batch()
+        sealed = self.journal.rotate()
+        dirty, snapshots = self._take_dirty()
+        self._last_compaction = time.monotonic()
+        self._force_compaction = False
+        return batch, sealed, dirty, snapshots
+
+    def _compact(self, batch, sealed, snapshots):
+        if batch:
+            self.journal.write_batch(batch)
+        self._write(snapshots)
+        self.journal.remove_through(sealed)
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            loop = asyncio.get_running_loop()
+            if self._compaction_due():
+                batch, sealed, dirty, snapshots = self._start_compaction()
+                try:
+                    await loop.run_in_executor(None, self._compact, batch, sealed, snapshots)
+                except OSError as e:
+                    print(f"ERROR: Journal compaction failed: {e}")
+                    self.journal.requeue(batch)
+                    for path, data in dirty.items():
+                        self._dirty.setdefault(path, data)
+                return
+            batch = self.journal.take_batch()
+            if batch:
+                self._pending = 0
+                try:
+                    await loop.run_in_executor(None, self.journal.write_batch, batch)
+                except OSError as e:
+                    print(f"ERROR: Failed to append to journal: {e}")
+                    self.journal.requeue(batch)
+
+    def flush_sync(self):
+        if not self._dirty and not self.journal.buffered:
+            return
+        batch, sealed, _, snapshots = self._start_compaction()
+        self._compact(batch, sealed, snapshots)
+
+
+class SqliteStore:
+    """Row-level storage backend for the player data files, backed by SQLite in WAL mode."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS honor (
+            user_id INTEGER PRIMARY KEY,
+            honor INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS stats (
+            user_id INTEGER NOT NULL,
+            stat TEXT NOT NULL,
+            value INTEGER NOT NULL,
+            PRIMARY KEY (user_id, stat)
+        );
+        CREATE TABLE IF NOT EXISTS skills (
+            user_id INTEGER NOT NULL,
+            skill TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            PRIMARY KEY (user_id, skill)
+        );
+        CREATE TABLE IF NOT EXISTS inventory (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN ('materials', 'crafted_items')),
+            name TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind, name)
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+    UPSERTS = {
+        "honor": "INSERT INTO honor (user_id, honor) VALUES (?, ?) "
+                 "ON CONFLICT (user_id) DO UPDATE SET honor = excluded.honor",
+        "stats": "INSERT INTO stats (user_id, stat, value) VALUES (?, ?, ?) "
+                 "ON CONFLICT (user_id, stat) DO UPDATE SET value = excluded.value",
+        "skills": "INSERT INTO skills (user_id, skill, level) VALUES (?, ?, ?) "
+                  "ON CONFLICT (user_id, skill) DO UPDATE SET level = excluded.level",
+        "armory": "INSERT INTO inventory (user_id, kind, name, amount) VALUES (?, ?, ?, ?) "
+                  "ON CONFLICT (user_id, kind, name) DO UPDATE SET amount = excluded.amount",
+    }
+
+    def __init__(self, db_path, tables, max_pending=100):
+        """tables maps each logical data file name to one of "honor", "stats", "skills" or "armory"."""
+        self.db_path = db_path
+        self.tables = tables
+        self.max_pending = max_pending
+        self._pending = 0
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def load(self, file_path):
+        kind = self.tables[file_path]
+        data = {}
+        if kind == "honor":
+            for user_id, honor in self._conn.execute("SELECT user_id, honor FROM honor"):
+                data[str(user_id)] = honor
+        elif kind in ("stats", "skills"):
+            for user_id, name, value in self._conn.execute(f"SELECT * FROM {kind}"):
+                data.setdefault(str(user_id), {})[name] = value
+        else:
+            query = "SELECT user_id, kind, name, amount FROM inventory"
+            for user_id, section, name, amount in self._conn.execute(query):
+                entry = data.setdefault(str(user_id), {"materials": {}, "crafted_items": {}})
+                entry[section][name] = amount
+        return data
+
+    @staticmethod
+    def _rows(kind, user_id, value):
+        user_id = int(user_id)
+        if kind == "honor":
+            return [(user_id, value)]
+        if kind in ("stats", "skills"):
+            return [(user_id, name, amount) for name, amount in value.items()]
+        return [(user_id, section, name, amount) for section in ("materials", "crafted_items")
+                for name, amount in value.get(section, {}).items()]
+
+    def load_user(self, file_path, user_id):
+        """One user's row from file_path in the JSON layout, or None if they have no entry there."""
+        kind = self.tables[file_path]
+        user_id = int(user_id)
+        if kind == "honor":
+            row = self._conn.execute("SELECT honor FROM honor WHERE user_id = ?", (user_id,)).fetchone()
+            return row[0] if row else None
+        if kind in ("stats", "skills"):
+            rows = self._conn.execute(f"SELECT * FROM {kind} WHERE user_id = ?", (user_id,)).fetchall()
+            return {name: value for _, name, value in rows} or None
+        rows = self._conn.execute("SELECT kind, name, amount FROM inventory WHERE user_id = ?", (user_id,)).fetchall()
+        if not rows:
+            return None
+        entry = {"materials": {}, "crafted_items": {}}
+        for section, name, amount in rows:
+            entry[section][name] = amount
+        return entry
+
+    def column(self, file_path, name=None):
+        """Maps every user ID to their honor, or to the named stat/skill, without loading whole rows."""
+        queries = {"honor": "SELECT user_id, honor FROM honor WHERE ? IS NULL",
+                   "stats": "SELECT user_id, value FROM stats WHERE stat = ?",
+                   "skills": "SELECT user_id, level FROM skills WHERE skill = ?"}
+        rows = self._conn.execute(queries[self.tables[file_path]], (name,))
+        return {str(user_id): value for user_id, value in rows}
+
+    def _upsert(self, kind, data, keys):
+        rows = []
+        for key in keys:
+            if key in data:
+                rows.extend(self._rows(kind, key, data[key]))
+        if kind == "armory":
+            # Rows are whole inventories and may leave out items that dropped to zero.
+            self._conn.executemany("DELETE FROM inventory WHERE user_id = ?", [(int(key),) for key in keys])
+        self._conn.executemany(self.UPSERTS[kind], rows)
+
+    def mark_dirty(self, file_path, data, *keys):
+        """Upserts the rows for the given user IDs, or every row of the file if none are given."""
+        self._upsert(self.tables[file_path], data, keys or list(data))
+        self._pending += 1
+        if self._pending >= self.max_pending:
+            self.flush_sync()
+
+    def record(self, op, file_path, data, user_id, **details):
+        self.mark_dirty(file_path, data, user_id)
+
+    def record_many(self, op, file_path, data, user_ids, rows=None, **details):
+        if user_ids:
+            self.mark_dirty(file_path, data if rows is None else rows, *user_ids)
+
+    async def flush(self):
+        self.flush_sync()
+
+    def flush_sync(self):
+        if self._pending:
+            self._conn.commit()
+            self._pending = 0
+
+    def import_json(self, source=None):
+        """One-shot import of the JSON backend's data. Returns False if the import already happened.
+
+        By default the JSON files named in tables are read. source, if given, is called instead and returns
+        {file_path: data}; it's only called when the import is still due.
+        """
+        if self._conn.execute("SELECT 1 FROM meta WHERE key = 'json_import'").fetchone():
+            return False
+        tables = source() if source is not None else {file_path: load_json(file_path) for file_path in self.tables}
+        with self._conn:
+            for file_path, kind in self.tables.items():
+                data = tables.get(file_path, {})
+                self._upsert(kind, data, list(data))
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('json_import', ?)",
+                               (",".join(self.tables),))
+        return True
@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from players import HONOR, PlayerTable  # noqa: E402
+from storage import SqliteStore  # noqa: E402
+
+HONOR_FILE = "honor.json"
+
+
+class SqlitePlayerTableTest(unittest.TestCase):
+    def setUp(self):
+        self.store = SqliteStore(":memory:", {HONOR_FILE: "honor"})
+        self.players = PlayerTable(loader=self.load_rows, max_resident=3)
+
+    def load_rows(self, user_id):
+        row = self.store.load_user(HONOR_FILE, user_id)
+        return None if row is None else {HONOR: row}
+
+    def grant(self, user_ids, amount):
+        # The same steps as add_honor_many in the bot.
+        user_ids = [str(user_id) for user_id in user_ids]
+        scores = {}
+        for user_id in user_ids:
+            player = self.players.get(user_id)
+            player.honor += amount
+            player.sections |= HONOR
+            scores[user_id] = player.honor
+        self.store.record_many("honor", HONOR_FILE, self.players.honor, user_ids, rows=scores, delta=amount)
+        self.store.flush_sync()
+
+    def test_batch_larger_than_cache_is_persisted(self):
+        self.grant(range(1, 7), 50)
+        self.grant(range(1, 7), 25)
+        self.assertEqual(self.store.load(HONOR_FILE), {str(user_id): 75 for user_id in range(1, 7)})
+
+    def test_unknown_user_is_not_admitted(self):
+        self.grant(range(1, 4), 10)
+        evictions = self.players.evictions
+        self.assertNotIn("999", self.players.honor)
+        self.assertIsNone(self.players.find(999))
+        self.assertEqual(self.players.evictions, evictions)
+        self.assertEqual(self.players.honor["1"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()